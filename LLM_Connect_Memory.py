@@ -1,36 +1,78 @@
+import argparse
+import itertools
 import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
+import numpy as np
 from dotenv import load_dotenv
-from langchain_groq import ChatGroq  # Groq API
-from langchain.chains import RetrievalQA
-from langchain.prompts import PromptTemplate
+from langchain_core.prompts import PromptTemplate
 from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from data_fetcher import DataFetcher
-from typing import Dict, Any, Optional, List
-from langchain.schema import Document
+from embedding_cache import get_embedding_model
+from article_store import open_article_store
+from data_fetcher import DataFetcher, TOP_TOPICS
+from knowledge_refresher import KnowledgeRefresher
+from chunk_store import copy_docstore
+from context_packer import ContextPacker, PackedContext
+from rw_lock import ReadWriteLock
+from semantic_cache import SemanticCache
+from startup import Warmup, print_report, warm_embedding_model, warm_reranker
+from tracing import tracer
+from LLM_Memory_Creation import (
+    DB_FAISS_PATH, BM25_PATH, WAL_PATH, articles_to_documents, chunk_documents, chunk_id, load_bm25_index,
+    sync_faiss_index,
+)
+from index_wal import IndexWAL
+from reranker import get_reranker
+from retrieval import HybridRetriever, TopicPartitions
+from topic_resolver import TopicResolver
+from vector_store import FLAT_INDEX_NAME, index_file_name, load_vector_store, owned_copy, save_vector_store
+from typing import Callable, Dict, Any, Iterable, Iterator, Optional, List, Tuple
+from langchain_core.documents import Document
 
 # Load environment variables
 load_dotenv()
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
-if not GROQ_API_KEY:
-    raise ValueError("Error: Groq API Key not found. Set it in the .env file.")
-
 # Initialize Groq LLM Model
 def load_llm():
+    if not GROQ_API_KEY:
+        raise ValueError("Error: Groq API Key not found. Set it in the .env file.")
+    from langchain_groq import ChatGroq  # Groq API; imported here as it takes ~1s
     print("Loading Groq AI Model...")
     return ChatGroq(model_name="llama3-8b-8192", api_key=GROQ_API_KEY)
 
 # Load FAISS database for retrieval
-def load_faiss_index():
+def load_faiss_index(update_log: Optional[IndexWAL] = None, embedding_model=None):
+    """
+    Load the index for serving. DOCBOT_INDEX picks "auto" (compressed copy if
+    one was exported), "compressed" or "flat"; flat and SQ8 indexes are
+    memory-mapped unless DOCBOT_INDEX_MMAP=0, so replicas share their pages.
+    Runtime updates in `update_log` are replayed on top of the snapshot.
+    """
     print("Loading FAISS index...")
-    embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-    return FAISS.load_local("vectorstore/db_faiss", embedding_model, allow_dangerous_deserialization=True)
+    embedding_model = embedding_model or get_embedding_model()
+    db, index_name = load_vector_store(
+        DB_FAISS_PATH, embedding_model,
+        prefer=os.getenv("DOCBOT_INDEX", "auto"),
+        mmap=os.getenv("DOCBOT_INDEX_MMAP", "1") != "0",
+        wal=update_log or IndexWAL(WAL_PATH)
+    )
+    print(f"✅ Loaded {index_name} ({db.index.ntotal} vectors)")
+    return db
 
-def extract_medical_topic(llm, question: str) -> Optional[str]:
+def extract_medical_topic(llm, question: str, resolver: Optional[TopicResolver] = None,
+                          question_vector=None) -> Optional[str]:
     """
-    Use LLM to extract the main medical topic/condition from the question.
+    Extract the main medical topic/condition from the question.
+    The local resolver is tried first; the LLM is only asked when it finds nothing.
     """
+    if resolver is not None:
+        topic = resolver.resolve(question, question_vector)
+        if topic is not None:
+            tracer.annotate("topic_source", "resolver")
+            return topic
+
     topic_prompt = PromptTemplate(
         template="""
         Extract the main medical condition or health topic from the question. 
@@ -42,60 +84,69 @@ def extract_medical_topic(llm, question: str) -> Optional[str]:
         input_variables=["question"]
     )
     
-    response = llm.invoke(topic_prompt.format(question=question))
+    tracer.annotate("topic_source", "llm")
+    with tracer.span("topic_llm"):
+        response = llm.invoke(topic_prompt.format(question=question))
     topic = response.content.strip()
     return None if topic.lower() == "none" else topic
 
+def fetch_topic_documents(topic: str, embed_model=None) -> List[Document]:
+    """
+    Fetch a topic from MedlinePlus, record it in the article store and return
+    its chunks, ready to be indexed. `embed_model` is the index's, for the
+    semantic chunker.
+    """
+    print(f"🔄 Fetching new data for topic: {topic}")
+    fetcher = DataFetcher([topic])
+    topic_data = fetcher.fetch_topic_data(concurrent=True)
+
+    if not topic_data or topic not in topic_data:
+        return []
+
+    if any(topic_data[topic].values()):
+        # Keep it in the corpus too, so the next index build includes it
+        open_article_store().append(topic, topic_data[topic])
+    return chunk_documents(articles_to_documents(topic, topic_data[topic]), embed_model=embed_model)
+
+def new_chunks_for_index(chunks: List[Document], faiss_db: FAISS) -> Dict[str, Document]:
+    """
+    Key chunks by content hash, dropping the ones already in the index.
+    """
+    existing_ids = set(faiss_db.index_to_docstore_id.values())
+    new_chunks = {}
+    for chunk in chunks:
+        doc_id = chunk_id(chunk)
+        if doc_id not in existing_ids:
+            new_chunks.setdefault(doc_id, chunk)
+    return new_chunks
+
+def clone_faiss_index(faiss_db: FAISS) -> FAISS:
+    """
+    Copy a FAISS store so it can be modified while the original keeps serving.
+    The copy owns its vectors even if the original is memory-mapped.
+    """
+    return FAISS(
+        embedding_function=faiss_db.embedding_function,
+        index=owned_copy(faiss_db.index),
+        docstore=copy_docstore(faiss_db.docstore),
+        index_to_docstore_id=dict(faiss_db.index_to_docstore_id),
+        normalize_L2=faiss_db._normalize_L2,
+        distance_strategy=faiss_db.distance_strategy,
+    )
+
 def update_faiss_with_new_data(topic: str, faiss_db: FAISS) -> bool:
     """
-    Fetch new data for a topic and add it to the FAISS index.
-    Returns True if successful, False otherwise.
+    Fetch new data for a topic, add it to `faiss_db` in place and save the index.
+    Returns True if the index changed, False otherwise. For scripts; a running
+    MedicalQA refreshes topics through its background refresher instead.
     """
     try:
-        print(f"🔄 Fetching new data for topic: {topic}")
-        fetcher = DataFetcher([topic])
-        topic_data = fetcher.fetch_topic_data()
-        
-        if not topic_data or topic not in topic_data:
+        chunks = fetch_topic_documents(topic, faiss_db.embeddings)
+        if not chunks:
             return False
-            
-        # Convert the new data to documents
-        new_documents = []
-        content = topic_data[topic]
-        
-        # Process health articles
-        for article in content.get('health_articles', []):
-            full_content = f"Title: {article['title']}\n\n{article['full_text']}"
-            metadata = {
-                'topic': topic,
-                'type': 'health',
-                'url': article['url'],
-                'source': 'MedlinePlus',
-                'source_type': 'medlineplus'
-            }
-            new_documents.append(Document(page_content=full_content, metadata=metadata))
-        
-        # Process drug articles
-        for article in content.get('drug_articles', []):
-            full_content = f"Title: {article['title']}\n\n{article['full_text']}"
-            metadata = {
-                'topic': topic,
-                'type': 'drug',
-                'url': article['url'],
-                'source': 'MedlinePlus',
-                'source_type': 'medlineplus'
-            }
-            new_documents.append(Document(page_content=full_content, metadata=metadata))
-        
-        if new_documents:
-            print(f"📥 Adding {len(new_documents)} new documents to FAISS index")
-            faiss_db.add_documents(new_documents)
-            # Save the updated index
-            faiss_db.save_local("vectorstore/db_faiss")
-            return True
-            
-        return False
-        
+        faiss_db.index = owned_copy(faiss_db.index)  # may be memory-mapped
+        _, stats = sync_faiss_index(chunks, faiss_db.embeddings, faiss_db)
+        return bool(stats["new"] or stats["removed"])
     except Exception as e:
         print(f"❌ Error updating FAISS index: {str(e)}")
         return False
@@ -119,50 +170,316 @@ def set_custom_prompt():
         input_variables=["context", "question"]
     )
 
+NEED_MORE_CONTEXT = "NEED_MORE_CONTEXT"
+# AnswerStream.status: a real answer, or a reply asking to try again once a topic refresh is done
+ANSWERED = "answered"
+PENDING_REFRESH = "pending_refresh"
+# Topic refreshes logged before the index is snapshotted again
+COMPACT_EVERY_UPDATES = 10
+
+class AnswerStream:
+    """
+    The tokens of one answer, with that request's own results filled in as it
+    runs: `ttft_ms` once the first token is out, `context`, the packed context
+    sent to the LLM (None for a cached answer), and `status`. Concurrent
+    requests on one MedicalQA each get their own.
+    """
+    def __init__(self, produce: Callable[["AnswerStream"], Iterator[str]]):
+        self.ttft_ms: Optional[float] = None
+        self.context: Optional[PackedContext] = None
+        self.status = ANSWERED
+        self._tokens = produce(self)
+
+    def __iter__(self) -> "AnswerStream":
+        return self
+
+    def __next__(self) -> str:
+        return next(self._tokens)
+
+    def text(self) -> str:
+        """Consume the rest of the stream and return the whole answer."""
+        return "".join(self).strip()
+
 class MedicalQA:
-    def __init__(self):
-        self.llm = load_llm()
-        self.db = load_faiss_index()
+    def __init__(self, llm=None, embedding_model=None):
+        """`llm` and `embedding_model` default to Groq and the cached Hugging Face model."""
+        self.llm = llm or load_llm()
+        self.prompt = set_custom_prompt()
+        self.update_log = IndexWAL(WAL_PATH)
+        self.db = load_faiss_index(self.update_log, embedding_model)
+        self.bm25 = load_bm25_index(self.db)
+        self.partitions = TopicPartitions(self.db)
+        self.topic_resolver = TopicResolver([*TOP_TOPICS, *self.partitions.names.values()], self.db.embeddings)
+        self.reranker = get_reranker()
         self.qa_chain = self._create_qa_chain()
+        self.refresher = KnowledgeRefresher(self._refresh_topic)
+        self.answer_cache = SemanticCache(self.db.embeddings)
+        self.context_packer = ContextPacker(token_budget=int(os.getenv("DOCBOT_CONTEXT_TOKENS", 768)))
+        self.index_lock = ReadWriteLock()
+        self._refresh_lock = threading.RLock()
 
-    def _create_qa_chain(self):
-        retriever = self.db.as_retriever(search_kwargs={"k": 3})
-        prompt = set_custom_prompt()
+    def _create_qa_chain(self, db: Optional[FAISS] = None, bm25=None, partitions=None):
+        from langchain.chains import RetrievalQA
+        retriever = HybridRetriever(
+            vectorstore=db or self.db, bm25=bm25 or self.bm25, partitions=partitions or self.partitions,
+            topic_resolver=self.topic_resolver, k=3, reranker=self.reranker
+        )
         return RetrievalQA.from_chain_type(
             llm=self.llm,
             chain_type="stuff",
             retriever=retriever,
-            return_source_documents=False,
-            chain_type_kwargs={"prompt": prompt}
+            return_source_documents=True,
+            chain_type_kwargs={"prompt": self.prompt}
         )
 
-    def answer_question(self, question: str) -> str:
-        # First attempt with existing knowledge
-        response = self.qa_chain.invoke({"query": question})
-        answer = response.get('result', '').strip()
-
-        # If we need more context, try to fetch new data
-        if answer == "NEED_MORE_CONTEXT":
-            print("🔍 Initial answer insufficient, attempting to fetch more data...")
-            topic = extract_medical_topic(self.llm, question)
-            
-            if topic:
-                print(f"📚 Identified topic: {topic}")
-                if update_faiss_with_new_data(topic, self.db):
-                    print("🔄 Retrying question with updated knowledge...")
-                    # Recreate the chain with updated index
-                    self.qa_chain = self._create_qa_chain()
-                    response = self.qa_chain.invoke({"query": question})
-                    answer = response.get('result', '').strip()
-                    
-                    if answer == "NEED_MORE_CONTEXT":
-                        return "I apologize, but I don't have enough information to provide a complete answer to your question, even after searching for more data."
-                else:
-                    return "I apologize, but I couldn't find additional information about this topic."
+    def _refresh_topic(self, topic: str) -> bool:
+        """
+        Runs on the background refresher: fetch and embed a topic into a copy of
+        the index, then swap the copy and its chain in under the write lock.
+        Refreshes are serialized, so concurrent ones can't drop each other's chunks.
+        The new chunks are appended to the update log rather than saving the
+        whole index; every COMPACT_EVERY_UPDATES refreshes a snapshot is written.
+        """
+        with self._refresh_lock, tracer.request("refresh", topic=topic):
+            with tracer.span("fetch_topic"):
+                new_chunks = new_chunks_for_index(fetch_topic_documents(topic, self.db.embeddings), self.db)
+            if not new_chunks:
+                print(f"ℹ️ No new data found for topic: {topic}")
+                return False
+
+            chunks = list(new_chunks.values())
+            texts = [chunk.page_content for chunk in chunks]
+            with tracer.span("embed_chunks"):
+                vectors = self.db.embeddings.embed_documents(texts)
+            tracer.count("chunks_added", len(chunks))
+
+            with tracer.span("index_update"):
+                new_db = clone_faiss_index(self.db)
+                new_db.add_embeddings(
+                    list(zip(texts, vectors)),
+                    metadatas=[chunk.metadata for chunk in chunks],
+                    ids=list(new_chunks.keys())
+                )
+                new_bm25 = self.bm25.copy()
+                new_bm25.add(list(new_chunks.keys()), texts)
+                new_partitions = TopicPartitions(new_db)
+                new_chain = self._create_qa_chain(new_db, new_bm25, new_partitions)
+            with self.index_lock.write():
+                self.db, self.bm25, self.partitions, self.qa_chain = new_db, new_bm25, new_partitions, new_chain
+            self.topic_resolver.add_topic(topic)
+            print(f"📥 Added {len(chunks)} new chunks for topic: {topic}")
+
+            dropped = self.answer_cache.invalidate_topic(topic)
+            if dropped:
+                print(f"🧹 Dropped {dropped} cached answers for topic: {topic}")
+
+            with tracer.span("wal_append"):
+                self.update_log.append(list(new_chunks.keys()), texts, [chunk.metadata for chunk in chunks], vectors)
+            if len(self.update_log) >= COMPACT_EVERY_UPDATES:
+                self.compact()
+            return True
+
+    def compact(self):
+        """
+        Fold the update log into a new snapshot and empty it. Replicas share the
+        snapshot and the log, so the saved snapshot is the one on disk plus every
+        logged record, read under the log's lock, not just this process's index.
+        """
+        with self._refresh_lock, self.update_log.exclusive():
+            records = self.update_log.records()
+            if not records:
+                return
+            print(f"🗜️ Compacting {len(records)} logged updates into a new snapshot...")
+            with tracer.span("snapshot_save"):
+                prefer = "flat" if index_file_name(self.db.index) == FLAT_INDEX_NAME else "compressed"
+                db, _ = load_vector_store(DB_FAISS_PATH, self.db.embeddings, prefer=prefer, mmap=False,
+                                          wal=self.update_log)
+                bm25 = load_bm25_index(db)
+                save_vector_store(db, DB_FAISS_PATH, wal_records=records)
+                bm25.save(BM25_PATH)
+                self.update_log.reset()
+
+    @property
+    def refresh_queue_depth(self) -> int:
+        return self.refresher.queue_depth
+
+    def _missing_context_reply(self, stream: AnswerStream, question: str, question_vector=None) -> str:
+        """Queue a background refresh for the question's topic and say so."""
+        print("🔍 Initial answer insufficient, queueing a knowledge refresh...")
+        with tracer.span("extract_topic"):
+            topic = extract_medical_topic(self.llm, question, self.topic_resolver, question_vector)
+        tracer.annotate("topic", topic)
+
+        if not topic:
+            return "I apologize, but I couldn't identify the medical topic in your question to search for more information."
+
+        print(f"📚 Identified topic: {topic}")
+        if self.refresher.enqueue(topic) or self.refresher.is_pending(topic):
+            print(f"🕒 Refresh queue depth: {self.refresher.queue_depth}")
+            stream.status = PENDING_REFRESH
+            return (
+                f"I don't have enough information about {topic} yet. "
+                "I'm looking up the latest MedlinePlus articles now, please ask again in a moment."
+            )
+        return "I apologize, but I don't have enough information to provide a complete answer to your question, even after searching for more data."
+
+    def stream_answer(self, question: str) -> AnswerStream:
+        """
+        Yield the answer as it is generated. Retrieval runs first, then the
+        prompt is streamed from the LLM. Output is held back only while it could
+        still be NEED_MORE_CONTEXT, so a normal answer starts after its first
+        token and the sentinel stops generation as soon as it is complete.
+        Time to first token and the packed context are kept on the returned stream.
+        """
+        def produce(stream: AnswerStream) -> Iterator[str]:
+            with tracer.request("answer"):
+                yield from self._stream_answer(stream, question)
+        return AnswerStream(produce)
+
+    def _stream_answer(self, stream: AnswerStream, question: str, question_vector=None,
+                       documents: Optional[List[Document]] = None) -> Iterator[str]:
+        """
+        `question_vector` (normalized) and `documents` may be computed up front,
+        as answer_batch does; with `documents` the answer cache has already been
+        checked by the caller.
+        """
+        start = time.perf_counter()
+        if question_vector is None:
+            with tracer.span("embed_question"):
+                question_vector = self.answer_cache.embed(question)
+        if documents is None:
+            with tracer.span("answer_cache"):
+                cached_answer, _ = self.answer_cache.lookup(question, question_vector)
+            if cached_answer is not None:
+                print(f"⚡ Semantic cache hit (hit rate {self.answer_cache.hit_rate:.0%})")
+                tracer.count("answer_cache_hit")
+                self._record_ttft(stream, start)
+                yield cached_answer
+                return
+
+            tracer.count("answer_cache_miss")
+            with self.index_lock.read(), tracer.span("retrieval"):
+                documents = self.qa_chain.retriever.invoke(question)
+        with tracer.span("pack_context"):
+            packed = self.context_packer.pack(documents)
+        self._record_context(stream, packed)
+        prompt = self.prompt.format(context=packed.text, question=question)
+
+        pending = ""
+        streaming = False
+        answer = []
+        llm_start = time.perf_counter()
+        for chunk in self.llm.stream(prompt):
+            usage = getattr(chunk, "usage_metadata", None)
+            if usage:
+                tracer.count("prompt_tokens", usage.get("input_tokens", 0))
+            token = chunk.content if hasattr(chunk, "content") else str(chunk)
+            if not token:
+                continue
+            tracer.count("completion_tokens")
+            if not streaming:
+                pending = (pending + token).lstrip()
+                if pending.startswith(NEED_MORE_CONTEXT):
+                    break
+                if NEED_MORE_CONTEXT.startswith(pending):
+                    continue
+                streaming, token = True, pending
+                self._record_ttft(stream, start)
+                tracer.observe("llm_first_token", time.perf_counter() - llm_start)
+            answer.append(token)
+            yield token
+        tracer.observe("llm", time.perf_counter() - llm_start)
+
+        if not streaming:
+            if pending and not pending.startswith(NEED_MORE_CONTEXT):
+                # A short answer that happened to be a prefix of the sentinel
+                self._record_ttft(stream, start)
+                answer.append(pending)
+                yield pending
             else:
-                return "I apologize, but I couldn't identify the medical topic in your question to search for more information."
+                tracer.annotate("need_more_context", True)
+                reply = self._missing_context_reply(stream, question, question_vector)
+                self._record_ttft(stream, start)
+                yield reply
+                return
+
+        topics = {doc.metadata.get('topic') for doc in documents}
+        self.answer_cache.store(question, "".join(answer).strip(), topics, vector=question_vector)
+
+    def _record_context(self, stream: AnswerStream, packed: PackedContext):
+        stream.context = packed
+        tracer.count("context_tokens", packed.tokens)
+        tracer.count("context_tokens_saved", packed.saved_tokens)
+        tracer.count("context_duplicates", packed.duplicates)
+        if packed.saved_tokens:
+            print(f"📦 Context packed to ~{packed.tokens} tokens, saved ~{packed.saved_tokens} "
+                  f"({packed.duplicates} duplicates, {packed.merged} merged"
+                  f"{', truncated' if packed.truncated else ''})")
+
+    def _record_ttft(self, stream: AnswerStream, start: float):
+        stream.ttft_ms = (time.perf_counter() - start) * 1000
+        print(f"⏱️ Time to first token: {stream.ttft_ms:.0f} ms")
+
+    def answer_question(self, question: str) -> str:
+        return self.stream_answer(question).text()
+
+    def _answer_prepared(self, question: str, question_vector, documents: List[Document]) -> Tuple[str, str]:
+        def produce(stream: AnswerStream) -> Iterator[str]:
+            with tracer.request("answer", batch=True):
+                yield from self._stream_answer(stream, question, question_vector, documents)
+        stream = AnswerStream(produce)
+        return stream.text(), stream.status
 
-        return answer
+    def answer_batch(self, questions: Iterable[str], batch_size: int = 64,
+                     max_concurrency: int = 8) -> Iterator[Tuple[int, str, str]]:
+        """
+        Answer many questions, yielding (position in `questions`, answer, status)
+        as each finishes; status is ANSWERED or PENDING_REFRESH. Every `batch_size` questions are embedded in one call, looked up
+        in the answer cache, and retrieved with one FAISS search per partition;
+        the remaining LLM calls run on `max_concurrency` threads while the next
+        batch is prepared.
+        """
+        questions = iter(questions)
+        position = 0
+        pending: Dict[Future, int] = {}
+        with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="docbot-batch") as executor:
+            while True:
+                batch = list(itertools.islice(questions, batch_size))
+                if not batch:
+                    break
+                with tracer.span("embed_questions"):
+                    raw = np.asarray(self.db.embeddings.embed_documents(batch), dtype=np.float32)
+                norms = np.linalg.norm(raw, axis=1, keepdims=True)
+                unit = raw / np.where(norms == 0, 1, norms)
+
+                misses = []
+                for offset, (question, vector) in enumerate(zip(batch, unit)):
+                    cached_answer, _ = self.answer_cache.lookup(question, vector)
+                    if cached_answer is not None:
+                        tracer.count("answer_cache_hit")
+                        yield position + offset, cached_answer, ANSWERED
+                    else:
+                        misses.append(offset)
+                tracer.count("answer_cache_miss", len(misses))
+
+                if misses:
+                    with self.index_lock.read(), tracer.span("retrieval_batch"):
+                        retrieved = self.qa_chain.retriever.retrieve_batch(
+                            [batch[offset] for offset in misses], raw[misses]
+                        )
+                    for offset, documents in zip(misses, retrieved):
+                        future = executor.submit(self._answer_prepared, batch[offset], unit[offset], documents)
+                        pending[future] = position + offset
+                position += len(batch)
+
+                # Keep about one batch queued behind the running calls
+                while len(pending) > max(batch_size, max_concurrency):
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield (pending.pop(future), *future.result())
+
+            for future in as_completed(pending):
+                yield (pending[future], *future.result())
 
 # Create the retrieval-based QA chatbot (for backward compatibility)
 def create_qa_chain():
@@ -171,9 +488,31 @@ def create_qa_chain():
 
 # Example usage
 if __name__ == "__main__":
-    medical_qa = MedicalQA()
+    parser = argparse.ArgumentParser(description="Ask DocBot medical questions.")
+    parser.add_argument("--batch", metavar="QUESTIONS_JSONL",
+                        help="Answer every question in a JSONL file instead of asking interactively.")
+    parser.add_argument("--output", default="answers.jsonl", help="Where batch answers are appended.")
+    parser.add_argument("--batch-size", type=int, default=64, help="Questions embedded and retrieved together.")
+    parser.add_argument("--concurrency", type=int, default=8, help="LLM calls in flight at once.")
+    args = parser.parse_args()
+
+    if args.batch:
+        from batch_qa import print_report as print_batch_report, run_batch
+        medical_qa = MedicalQA()
+        print_batch_report(run_batch(medical_qa, args.batch, args.output, args.batch_size, args.concurrency))
+        medical_qa.refresher.join()
+        medical_qa.compact()
+        raise SystemExit(0)
+
+    # Load the model and index while the first question is being typed
+    warmup = Warmup([
+        ("embedding_model", warm_embedding_model), ("reranker", warm_reranker), ("medical_qa", MedicalQA)
+    ]).start()
     while True:
         question = input("\nEnter your medical question (or 'quit' to exit): ")
         if question.lower() in ['quit', 'exit']:
             break
-        print("\n🤖 Answer:", medical_qa.answer_question(question))
+        print("\n🤖 Answer:", warmup.result().answer_question(question))
+    if warmup.ready:
+        print_report(warmup.report())
+        warmup.result().compact()
@@ -1,119 +1,236 @@
 import os
 import json
-from typing import List, Dict
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.embeddings import HuggingFaceEmbeddings
+import hashlib
+import argparse
+from typing import Iterable, List, Dict, Optional, Tuple
+from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import FAISS
-from langchain.schema import Document
-from langchain_community.document_loaders import DirectoryLoader, PyPDFLoader
+from langchain_core.documents import Document
+from article_store import ARTICLE_STORE_PATH, open_article_store
+from embedding_cache import get_embedding_model
+from embedding_pipeline import EmbeddingPipeline
+from bm25_index import BM25Index
+from pdf_ingest import PdfChanges, PdfIngestor
+from semantic_chunker import SemanticChunker
+from index_wal import WAL_NAME, IndexWAL
+from vector_store import (
+    FLAT_INDEX_NAME, INDEX_TYPES, MIN_RECALL, docstore_exists, export_compressed_index, flat_vectors, load_docstore,
+    read_index, recall_latency_report, replay_wal, save_vector_store,
+)
 
 # Define paths
 DATA_PATH = "data/"
-JSON_PATH = "topic_article_store.json"
 DB_FAISS_PATH = "vectorstore/db_faiss"
+MANIFEST_PATH = os.path.join(DB_FAISS_PATH, "manifest.json")
+BM25_PATH = os.path.join(DB_FAISS_PATH, "bm25.json")
+WAL_PATH = os.path.join(DB_FAISS_PATH, WAL_NAME)
+CHUNKER = os.getenv("DOCBOT_CHUNKER", "semantic")
 
 def faiss_index_exists() -> bool:
     """
     Check if FAISS index files exist.
     """
-    index_files = ["index.faiss", "index.pkl"]
-    return all(os.path.exists(os.path.join(DB_FAISS_PATH, f)) for f in index_files)
+    return os.path.exists(os.path.join(DB_FAISS_PATH, FLAT_INDEX_NAME)) and docstore_exists(DB_FAISS_PATH)
 
 def load_existing_faiss(embed_model) -> FAISS:
     """
-    Load existing FAISS index if it exists, allowing trusted deserialization.
+    Load the existing flat FAISS index and its chunk store, then apply the
+    runtime update log. Chunks added at runtime while a compressed index was
+    being served are missing from the flat index; they are embedded (from the
+    embedding cache) and appended so the flat index matches the docstore again.
     """
     print("✅ Loading existing FAISS index...")
-    return FAISS.load_local(DB_FAISS_PATH, embed_model, allow_dangerous_deserialization=True)
+    docstore, index_to_docstore_id = load_docstore(DB_FAISS_PATH)
+    index = read_index(os.path.join(DB_FAISS_PATH, FLAT_INDEX_NAME))
+    db = FAISS(embed_model, index, docstore, index_to_docstore_id)
+    update_log = IndexWAL(WAL_PATH)
+    missing = len(db.index_to_docstore_id) - db.index.ntotal
+    replayed = replay_wal(db, update_log.records(), embed_unlogged=True)
+    if replayed or missing:
+        save_vector_store(db, DB_FAISS_PATH, keep_compressed=not replayed)
+        update_log.reset()
+    return db
 
-def load_pdf_files(data_path: str) -> List[Document]:
+def load_changed_pdfs(ingestor: PdfIngestor, existing_db=None) -> Tuple[List[Document], PdfChanges]:
     """
-    Load all PDF files from a directory and extract text.
+    Pages of the PDFs added or changed since the index was last built, and the
+    scan, whose removed_sources are to be dropped from the index.
     """
-    if not os.path.exists(data_path):
-        print(f"⚠️ Warning: Directory '{data_path}' does not exist.")
-        return []
-    
-    print("📄 Loading PDFs...")
-    loader = DirectoryLoader(data_path, glob="*.pdf", loader_cls=PyPDFLoader)
-    documents = loader.load()
-    
-    for doc in documents:
-        doc.metadata.update({
-            'source_type': 'pdf',
-            'source': os.path.basename(doc.metadata.get('source', ''))
-        })
-    
-    print(f"✅ Loaded {len(documents)} documents from PDFs.")
-    return documents
+    indexed_sources = None
+    if existing_db is not None:
+        indexed_sources = {entry["source"] for entry in reconcile_manifest(load_manifest(), existing_db).values()}
+    changes = ingestor.scan(indexed_sources)
+    print(f"📄 PDFs: {changes.summary()}")
+    documents = ingestor.load(changes.to_load)
+    if changes.to_load:
+        print(f"✅ Loaded {len(documents)} pages ({ingestor.stats['cached_files']} files from the page cache).")
+    return documents, changes
 
-def load_json_data(json_path: str) -> List[Document]:
+def articles_to_documents(topic: str, content: Dict) -> List[Document]:
     """
-    Load medical articles from JSON and convert to Documents.
+    Convert one topic's fetched health and drug articles to Documents.
     """
-    if not os.path.exists(json_path):
-        print(f"⚠️ Warning: File '{json_path}' does not exist.")
-        return []
-    
-    print("📄 Loading JSON data...")
-    with open(json_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    
     documents = []
-    
-    for topic, content in data.items():
-        for article in content.get('health_articles', []):
+    for article_key, article_type in (('health_articles', 'health'), ('drug_articles', 'drug')):
+        for article in content.get(article_key, []):
             full_content = f"Title: {article['title']}\n\n{article['full_text']}"
             metadata = {
                 'topic': topic,
-                'type': 'health',
+                'type': article_type,
                 'url': article['url'],
                 'source': 'MedlinePlus',
                 'source_type': 'medlineplus'
             }
             documents.append(Document(page_content=full_content, metadata=metadata))
-        
-        for article in content.get('drug_articles', []):
-            full_content = f"Title: {article['title']}\n\n{article['full_text']}"
-            metadata = {
-                'topic': topic,
-                'type': 'drug',
-                'url': article['url'],
-                'source': 'MedlinePlus',
-                'source_type': 'medlineplus'
-            }
-            documents.append(Document(page_content=full_content, metadata=metadata))
-    
-    print(f"✅ Loaded {len(documents)} articles from JSON.")
     return documents
 
-def chunk_documents(documents: List[Document], chunk_size=512, chunk_overlap=50):
+def load_article_store(store_path: str = ARTICLE_STORE_PATH) -> List[Document]:
+    """
+    Stream the article store one topic at a time and convert it to Documents.
+    The legacy topic_article_store.json is converted on first use.
+    """
+    store = open_article_store(store_path)
+    if not os.path.exists(store.path):
+        print(f"⚠️ Warning: File '{store.path}' does not exist.")
+        return []
+
+    print("📄 Loading article store...")
+    documents = []
+    for topic, content in store.items():
+        documents.extend(articles_to_documents(topic, content))
+
+    print(f"✅ Loaded {len(documents)} articles from {store.path}.")
+    return documents
+
+def chunk_documents(documents: List[Document], chunk_size=512, chunk_overlap=50, embed_model=None,
+                    method: Optional[str] = None, batch_size: int = 256, workers: int = 1):
     """
     Splits documents into smaller chunks for efficient embedding.
+    `method` is "semantic" (SemanticChunker, the default) or "recursive" (the
+    character splitter, using chunk_size/chunk_overlap); DOCBOT_CHUNKER sets
+    the default. The semantic chunker embeds sentences with `embed_model`,
+    `batch_size` at a time on `workers` processes. Each chunk's metadata gets
+    its position within its document as `chunk_index`.
     """
     if not documents:
         return []
-        
-    print("🧩 Chunking documents...")
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap,
-        separators=["\n\n", "\n", ". ", " ", ""]
-    )
-    chunks = text_splitter.split_documents(documents)
+
+    method = method or CHUNKER
+    print(f"🧩 Chunking documents ({method})...")
+    if method == "semantic":
+        chunks = SemanticChunker(
+            embed_model or get_embeddings(), batch_size=batch_size, workers=workers
+        ).split_documents(documents)
+    else:
+        text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            separators=["\n\n", "\n", ". ", " ", ""]
+        )
+        chunks = []
+        for doc in documents:
+            for chunk_index, chunk in enumerate(text_splitter.split_documents([doc])):
+                chunk.metadata["chunk_index"] = chunk_index
+                chunks.append(chunk)
     print(f"✅ Created {len(chunks)} text chunks.")
     return chunks
 
 def get_embeddings():
     """
-    Loads a Hugging Face model for embedding creation.
+    Returns the Hugging Face embedding model, wrapped in the shared on-disk
+    embedding cache. The model itself is only loaded on a cache miss.
+    """
+    return get_embedding_model()
+
+def chunk_id(chunk: Document) -> str:
+    """
+    Stable id for a chunk: a SHA-256 of its content and metadata.
+    Used as the FAISS docstore id, so identical chunks are stored only once.
+    """
+    payload = json.dumps(
+        {"content": chunk.page_content, "metadata": chunk.metadata},
+        sort_keys=True, ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def chunk_source(metadata: Dict) -> str:
+    """
+    Source key a chunk belongs to ("pdf:<file>" or "topic:<name>").
+    Stale chunks are only removed for sources that were reloaded.
     """
-    print("🧠 Loading embedding model...")
-    return HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+    if metadata.get('source_type') == 'pdf':
+        return f"pdf:{metadata.get('source', '')}"
+    return f"topic:{metadata.get('topic', '')}"
 
-def store_embeddings_faiss(chunks: List[Document], embed_model, existing_db=None):
+def load_manifest() -> Dict[str, Dict]:
+    """
+    Load the chunk manifest ({chunk_id: {"source": ...}}) saved next to the index.
+    """
+    if not os.path.exists(MANIFEST_PATH):
+        return {}
+    with open(MANIFEST_PATH, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_manifest(manifest: Dict[str, Dict]):
+    """
+    Atomically write the chunk manifest.
+    """
+    os.makedirs(DB_FAISS_PATH, exist_ok=True)
+    tmp_path = f"{MANIFEST_PATH}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+def reconcile_manifest(manifest: Dict[str, Dict], db: FAISS) -> Dict[str, Dict]:
+    """
+    Make the manifest match the ids actually stored in the index. Documents added
+    outside this script (e.g. runtime topic fetches) are adopted by their metadata.
+    """
+    reconciled = {}
+    for doc_id in db.index_to_docstore_id.values():
+        if doc_id in manifest:
+            reconciled[doc_id] = manifest[doc_id]
+        else:
+            doc = db.docstore.search(doc_id)
+            metadata = doc.metadata if isinstance(doc, Document) else {}
+            reconciled[doc_id] = {"source": chunk_source(metadata)}
+    return reconciled
+
+def save_faiss_index(db: FAISS):
+    """
+    Persist the FAISS index to disk, along with a BM25 index over the same chunks.
+    """
+    save_vector_store(db, DB_FAISS_PATH)
+    print("🔤 Building BM25 index...")
+    BM25Index.from_faiss(db).save(BM25_PATH)
+    IndexWAL(WAL_PATH).reset()
+    print("✅ FAISS index saved successfully!")
+
+def load_bm25_index(db: FAISS) -> BM25Index:
+    """
+    Load the BM25 index saved with `db`. Chunks replayed from the update log
+    since it was saved are added to it; if it is missing or has chunks the
+    FAISS docstore doesn't, it is rebuilt.
+    """
+    bm25 = BM25Index.load(BM25_PATH)
+    doc_ids = list(db.index_to_docstore_id.values())
+    if bm25 is not None and set(bm25.doc_ids) <= set(doc_ids):
+        indexed = set(bm25.doc_ids)
+        missing = [doc_id for doc_id in doc_ids if doc_id not in indexed]
+        if missing:
+            bm25.add(missing, [db.docstore.search(doc_id).page_content for doc_id in missing])
+        return bm25
+
+    print("🔤 BM25 index missing or out of date, rebuilding it...")
+    bm25 = BM25Index.from_faiss(db)
+    bm25.save(BM25_PATH)
+    return bm25
+
+def store_embeddings_faiss(chunks: List[Document], embed_model, existing_db=None, ids: Optional[List[str]] = None,
+                           batch_size: int = 256, workers: int = 1):
     """
     Creates or updates FAISS index for storing and retrieving embeddings.
+    Chunks are streamed through the batched EmbeddingPipeline.
     """
     if not chunks:
         print("⚠️ Warning: No chunks found. Skipping FAISS storage.")
@@ -121,48 +238,142 @@ def store_embeddings_faiss(chunks: List[Document], embed_model, existing_db=None
     
     print("💾 Creating/Updating FAISS index...")
     
-    if existing_db:
-        existing_db.add_documents(chunks)
-        db = existing_db
-    else:
-        db = FAISS.from_documents(chunks, embed_model)
+    if ids is None:
+        ids = [chunk_id(chunk) for chunk in chunks]
+    pipeline = EmbeddingPipeline(embed_model, batch_size=batch_size, workers=workers)
+    db = pipeline.run(zip(ids, chunks), existing_db, total=len(chunks))
     
-    os.makedirs(os.path.dirname(DB_FAISS_PATH), exist_ok=True)
-    db.save_local(DB_FAISS_PATH)
-    
-    print("✅ FAISS index saved successfully!")
+    save_faiss_index(db)
     return db
 
+def sync_faiss_index(chunks: List[Document], embed_model, existing_db=None,
+                     batch_size: int = 256, workers: int = 1,
+                     removed_sources: Iterable[str] = ()) -> Tuple[Optional[FAISS], Dict[str, int]]:
+    """
+    Incrementally bring the FAISS index in line with `chunks`.
+    Only chunks whose content hash is not in the manifest are embedded, and
+    chunks of reloaded sources that no longer exist are deleted, as are all
+    chunks of `removed_sources` (e.g. deleted PDFs). Sources that were not
+    reloaded, such as unchanged PDFs and topics fetched at runtime, are left alone.
+    """
+    manifest = reconcile_manifest(load_manifest(), existing_db) if existing_db else {}
+
+    current = {}
+    for chunk in chunks:
+        current.setdefault(chunk_id(chunk), chunk)
+
+    loaded_sources = {chunk_source(chunk.metadata) for chunk in current.values()} | set(removed_sources)
+    stale_ids = [
+        doc_id for doc_id, entry in manifest.items()
+        if doc_id not in current and entry["source"] in loaded_sources
+    ]
+    new_ids = [doc_id for doc_id in current if doc_id not in manifest]
+
+    stats = {"new": len(new_ids), "removed": len(stale_ids), "unchanged": len(current) - len(new_ids)}
+    print(f"🧮 Chunks: {stats['new']} new, {stats['removed']} stale, {stats['unchanged']} unchanged")
+
+    if not new_ids and not stale_ids:
+        print("✅ FAISS index is already up to date.")
+        if existing_db:
+            save_manifest(manifest)
+        return existing_db, stats
+
+    if stale_ids:
+        print(f"🗑️ Removing {len(stale_ids)} stale chunks...")
+        existing_db.delete(stale_ids)
+        for doc_id in stale_ids:
+            del manifest[doc_id]
+
+    if new_ids:
+        db = store_embeddings_faiss(
+            [current[doc_id] for doc_id in new_ids], embed_model, existing_db, ids=new_ids,
+            batch_size=batch_size, workers=workers
+        )
+        for doc_id in new_ids:
+            manifest[doc_id] = {"source": chunk_source(current[doc_id].metadata)}
+    else:
+        db = existing_db
+        save_faiss_index(db)
+
+    save_manifest(manifest)
+    return db, stats
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build or update the DocBot FAISS index.")
+    parser.add_argument("--batch-size", type=int, default=256, help="Chunks embedded per batch.")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 1) // 2),
+                        help="Embedding worker processes (1 embeds in this process).")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="flat",
+                        help="Also export a compressed index for serving (sq8 or ivfpq).")
+    parser.add_argument("--nlist", type=int, default=None, help="IVF lists (default: 4 * sqrt(n)).")
+    parser.add_argument("--pq-m", type=int, default=48, help="PQ sub-quantizers, must divide the dimension.")
+    parser.add_argument("--nprobe", type=int, default=32, help="IVF lists probed per query.")
+    parser.add_argument("--min-recall", type=float, default=MIN_RECALL,
+                        help="Don't export a compressed index whose recall@10 is lower (0 exports any).")
+    parser.add_argument("--report", action="store_true",
+                        help="Print a recall-vs-latency comparison of flat, sq8 and ivfpq.")
+    return parser.parse_args()
+
+def print_index_report(db: FAISS, min_recall: float = MIN_RECALL, **build_kwargs):
+    """
+    Print recall@10 and latency of each index type against exact flat search.
+    """
+    print("📏 Comparing index types against exact search...")
+    print(f"   {'index':<8}{'recall@10':>10}{'ms/query':>10}{'size MB':>10}{'build s':>10}")
+    for row in recall_latency_report(flat_vectors(db.index), **build_kwargs):
+        low = "  ⚠️ below export minimum" if row['recall@10'] < min_recall else ""
+        print(f"   {row['index_type']:<8}{row['recall@10']:>10.3f}{row['latency_ms']:>10.3f}"
+              f"{row['size_mb']:>10.1f}{row['build_seconds']:>10.1f}{low}")
+
 # Main execution
 if __name__ == "__main__":
+    args = parse_args()
     try:
         embed_model = get_embeddings()
         existing_db = None
-        pdf_documents = []
 
-        if faiss_index_exists():
+        if faiss_index_exists() and os.path.exists(MANIFEST_PATH):
             print("📚 Found existing FAISS index")
             existing_db = load_existing_faiss(embed_model)
+        elif faiss_index_exists():
+            print("♻️ Existing FAISS index has no chunk manifest, rebuilding it from scratch")
         else:
             print("🆕 No existing FAISS index found, will create new one")
-            pdf_documents = load_pdf_files(DATA_PATH)
 
-        json_documents = load_json_data(JSON_PATH)
-        documents_to_process = json_documents + pdf_documents
+        pdf_ingestor = PdfIngestor(DATA_PATH, workers=args.workers)
+        pdf_documents, pdf_changes = load_changed_pdfs(pdf_ingestor, existing_db)
+        article_documents = load_article_store()
+        documents_to_process = article_documents + pdf_documents
 
-        if not documents_to_process:
+        if not documents_to_process and not (existing_db and pdf_changes.removed):
             print("❌ No documents found to process!")
             exit(1)
             
-        chunked_docs = chunk_documents(documents_to_process)
-        faiss_index = store_embeddings_faiss(chunked_docs, embed_model, existing_db)
+        chunked_docs = chunk_documents(documents_to_process, embed_model=embed_model,
+                                       batch_size=args.batch_size, workers=args.workers)
+        faiss_index, sync_stats = sync_faiss_index(
+            chunked_docs, embed_model, existing_db, batch_size=args.batch_size, workers=args.workers,
+            removed_sources=pdf_changes.removed_sources
+        )
         
         if faiss_index:
+            pdf_ingestor.commit(pdf_changes)
             print("🚀 FAISS embedding storage process completed successfully!")
             print(f"📊 Stats:")
-            print(f"   - PDF documents: {len(pdf_documents)}")
-            print(f"   - JSON articles: {len(json_documents)}")
+            print(f"   - PDF pages loaded: {len(pdf_documents)} ({pdf_changes.summary()})")
+            print(f"   - MedlinePlus articles: {len(article_documents)}")
             print(f"   - Total chunks: {len(chunked_docs)}")
+            print(f"   - New chunks embedded: {sync_stats['new']}")
+            print(f"   - Stale chunks removed: {sync_stats['removed']}")
+            print(f"   - Vectors in index: {faiss_index.index.ntotal}")
+
+            build_kwargs = {"nlist": args.nlist, "pq_m": args.pq_m, "nprobe": args.nprobe}
+            if args.index_type != "flat":
+                print(f"🗜️ Exporting {args.index_type} index for serving...")
+                export_compressed_index(faiss_index, DB_FAISS_PATH, args.index_type, min_recall=args.min_recall,
+                                        **build_kwargs)
+            if args.report:
+                print_index_report(faiss_index, min_recall=args.min_recall, **build_kwargs)
         else:
             print("⚠️ FAISS storage failed.")
             
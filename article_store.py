@@ -0,0 +1,199 @@
+"""
+This module contains the ArticleStore class, the append-only corpus of fetched
+MedlinePlus articles that index builds read from.
+
+The store is a JSONL file with one record per fetched topic:
+
+    {"topic": "Asthma", "fetched_at": 1712345678.9, "content": {"health_articles": [...], "drug_articles": [...]}}
+
+Fetching a topic again appends a new record, which replaces the older one for
+readers; `compact()` drops the replaced records. Readers keep an index of
+where each topic's latest record starts and only scan bytes appended since
+their last read, so the file is never loaded in one go.
+
+Usage:
+    python article_store.py convert [topic_article_store.json] [topic_articles.jsonl]
+    python article_store.py compact [topic_articles.jsonl]
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+ARTICLE_STORE_PATH = "topic_articles.jsonl"
+LEGACY_STORE_PATH = "topic_article_store.json"
+
+_RECORD_PREFIX = '{"topic": '
+_decoder = json.JSONDecoder()
+
+
+def _record_topic(line: str) -> str:
+    """The topic of a record line, without parsing its (large) content."""
+    if not line.rstrip().endswith("}}"):
+        raise ValueError("incomplete record")
+    if line.startswith(_RECORD_PREFIX):
+        topic, _ = _decoder.raw_decode(line, len(_RECORD_PREFIX))
+        return topic
+    return json.loads(line)["topic"]
+
+
+class ArticleStore:
+    def __init__(self, path: str = ARTICLE_STORE_PATH):
+        self.path = path
+        self._offsets: Dict[str, Tuple[int, int]] = {}
+        self._scanned = 0
+        self._inode: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _catch_up(self):
+        """Index records appended (by anyone) since the last scan."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._offsets, self._scanned, self._inode = {}, 0, None
+            return
+        if stat.st_ino != self._inode or stat.st_size < self._scanned:
+            # Compacted or replaced since the last scan
+            self._offsets, self._scanned, self._inode = {}, 0, stat.st_ino
+        if stat.st_size == self._scanned:
+            return
+
+        with open(self.path, "rb") as f:
+            f.seek(self._scanned)
+            offset = self._scanned
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break  # an append still in progress, or torn by a crash
+                try:
+                    topic = _record_topic(raw.decode("utf-8"))
+                except (ValueError, KeyError, UnicodeDecodeError):
+                    print(f"⚠️ Skipping unreadable record at byte {offset} of {self.path}")
+                else:
+                    self._offsets[topic] = (offset, len(raw))
+                offset += len(raw)
+            self._scanned = offset
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._catch_up()
+            return len(self._offsets)
+
+    def __contains__(self, topic: str) -> bool:
+        with self._lock:
+            self._catch_up()
+            return topic in self._offsets
+
+    def topics(self) -> List[str]:
+        """Stored topics, in the order they were first fetched."""
+        with self._lock:
+            self._catch_up()
+            return list(self._offsets)
+
+    def _read(self, f, offset: int, length: int) -> Dict:
+        f.seek(offset)
+        return json.loads(f.read(length))
+
+    def get(self, topic: str) -> Optional[Dict]:
+        """The latest content stored for `topic`, or None."""
+        with self._lock:
+            self._catch_up()
+            location = self._offsets.get(topic)
+        if location is None:
+            return None
+        with open(self.path, "rb") as f:
+            return self._read(f, *location)["content"]
+
+    def items(self) -> Iterator[Tuple[str, Dict]]:
+        """(topic, content) for the latest record of every topic, one record in memory at a time."""
+        with self._lock:
+            self._catch_up()
+            locations = list(self._offsets.items())
+        if not locations:
+            return
+        with open(self.path, "rb") as f:
+            for topic, location in locations:
+                yield topic, self._read(f, *location)["content"]
+
+    def append(self, topic: str, content: Dict):
+        """Add (or replace) a topic's articles with a single appended line."""
+        line = json.dumps({"topic": topic, "fetched_at": time.time(), "content": content}, ensure_ascii=False)
+        data = (line + "\n").encode("utf-8")
+        with self._lock:
+            fd = os.open(self.path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                size = os.fstat(fd).st_size
+                if size and os.pread(fd, 1, size - 1) != b"\n":
+                    # A crash left half a record; end it so ours starts on its own line
+                    data = b"\n" + data
+                os.write(fd, data)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def compact(self) -> int:
+        """
+        Rewrite the file with only each topic's latest record. Returns the bytes
+        saved. Run it while nothing else is appending, e.g. between fetches.
+        """
+        with self._lock:
+            self._catch_up()
+            if self._inode is None:
+                return 0
+            before = self._scanned
+            tmp_path = f"{self.path}.tmp"
+            with open(self.path, "rb") as src, open(tmp_path, "wb") as dst:
+                for offset, length in self._offsets.values():
+                    src.seek(offset)
+                    dst.write(src.read(length))
+                dst.flush()
+                os.fsync(dst.fileno())
+            os.replace(tmp_path, self.path)
+            self._offsets, self._scanned, self._inode = {}, 0, None
+            self._catch_up()
+            return before - self._scanned
+
+
+def convert_legacy_store(json_path: str = LEGACY_STORE_PATH, store_path: str = ARTICLE_STORE_PATH) -> ArticleStore:
+    """Write a topic_article_store.json-style document out as an ArticleStore."""
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    tmp_path = f"{store_path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    tmp_store = ArticleStore(tmp_path)
+    for topic, content in data.items():
+        tmp_store.append(topic, content)
+    os.replace(tmp_path, store_path)
+    print(f"🔁 Converted {len(data)} topics from {json_path} to {store_path}")
+    return ArticleStore(store_path)
+
+
+def open_article_store(path: str = ARTICLE_STORE_PATH, legacy_path: str = LEGACY_STORE_PATH) -> ArticleStore:
+    """The store at `path`, converted from `legacy_path` first if only that exists."""
+    if not os.path.exists(path) and os.path.exists(legacy_path):
+        return convert_legacy_store(legacy_path, path)
+    return ArticleStore(path)
+
+
+def read_topics(path: str) -> Dict[str, Dict]:
+    """Every topic's content from either a legacy .json store or an ArticleStore file."""
+    if path.endswith(".json"):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return dict(ArticleStore(path).items())
+
+
+if __name__ == "__main__":
+    command, args = (sys.argv[1], sys.argv[2:]) if len(sys.argv) > 1 else ("", [])
+    if command == "convert":
+        convert_legacy_store(*args[:2])
+    elif command == "compact":
+        store = ArticleStore(*args[:1])
+        print(f"🧹 Compacted {store.path}, saved {store.compact()} bytes ({len(store)} topics)")
+    else:
+        print(__doc__)
+        sys.exit(1)
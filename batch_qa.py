@@ -0,0 +1,116 @@
+"""
+This module runs MedicalQA.answer_batch over a JSONL file of questions, for
+evaluation runs and warming the answer cache.
+
+Input lines are {"question": "...", "id": "..."} ("id" defaults to the line
+number). Each answer is appended to the output file as soon as it is ready:
+
+    {"id": "...", "question": "...", "answer": "...", "status": "answered"}
+
+Ids already answered in the output are skipped, so an interrupted run picks up
+where it stopped when started again with the same files. A "pending_refresh"
+record (the topic was missing and is being fetched) is asked again next run.
+"""
+
+import itertools
+import json
+import os
+import time
+from typing import Dict, Iterator, Set, Tuple
+
+
+def read_questions(path: str) -> Iterator[Tuple[str, str]]:
+    """(id, question) for every non-blank line of a JSONL file."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            yield str(record.get("id", line_number)), record["question"]
+
+
+def completed_ids(path: str) -> Set[str]:
+    """
+    Ids answered by earlier runs. A line cut off by a crash doesn't count, and
+    neither does a reply waiting on a topic refresh (records before statuses
+    were written count as answered).
+    """
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.endswith("\n"):
+                break
+            try:
+                record = json.loads(line)
+                if record.get("status", "answered") == "answered":
+                    done.add(record["id"])
+            except (ValueError, KeyError):
+                continue
+    return done
+
+
+def run_batch(qa, input_path: str, output_path: str, batch_size: int = 64, max_concurrency: int = 8) -> Dict:
+    """Answer every question in `input_path` not yet in `output_path`. Returns a throughput report."""
+    done = completed_ids(output_path)
+    todo: Dict[int, Tuple[str, str]] = {}
+    positions = itertools.count()
+    skipped = 0
+
+    def questions() -> Iterator[str]:
+        nonlocal skipped
+        for question_id, question in read_questions(input_path):
+            if question_id in done:
+                skipped += 1
+                continue
+            done.add(question_id)  # later duplicates of an id are skipped too
+            todo[next(positions)] = (question_id, question)
+            yield question
+
+    cache_hits_before = qa.answer_cache.stats["hits"]
+    answered = 0
+    pending_refresh = 0
+    start = time.perf_counter()
+    with open(output_path, "a", encoding="utf-8") as out:
+        if out.tell() and not _ends_with_newline(output_path):
+            out.write("\n")
+        for position, answer, status in qa.answer_batch(questions(), batch_size=batch_size,
+                                                        max_concurrency=max_concurrency):
+            question_id, question = todo.pop(position)
+            record = {"id": question_id, "question": question, "answer": answer, "status": status}
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            if status == "answered":
+                answered += 1
+            else:
+                pending_refresh += 1
+            written = answered + pending_refresh
+            if written % 100 == 0:
+                elapsed = time.perf_counter() - start
+                print(f"📝 {written} done ({written / elapsed:.1f} q/s)")
+        os.fsync(out.fileno())
+    elapsed = time.perf_counter() - start
+
+    return {
+        "answered": answered,
+        "skipped": skipped,
+        "pending_refresh": pending_refresh,
+        "answer_cache_hits": qa.answer_cache.stats["hits"] - cache_hits_before,
+        "seconds": elapsed,
+        "questions_per_second": (answered + pending_refresh) / elapsed if elapsed else 0.0,
+    }
+
+
+def _ends_with_newline(path: str) -> bool:
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def print_report(report: Dict):
+    print(f"📊 Batch: {report['answered']} answered in {report['seconds']:.1f}s "
+          f"({report['questions_per_second']:.1f} q/s), {report['skipped']} already done, "
+          f"{report['answer_cache_hits']} from the answer cache")
+    if report["pending_refresh"]:
+        print(f"🕒 {report['pending_refresh']} waiting on a topic refresh, run again to answer them")
@@ -0,0 +1,673 @@
+"""
+This module contains DocBot's offline benchmark harness.
+
+Nothing leaves the machine (unless --record-responses is given): MedlinePlus is
+replaced by a local HTTP stub that renders topic_article_store.json in
+MedlinePlus's XML search format, Groq by a deterministic fake chat model with
+configurable latency, and (by default) the Hugging Face model by a hashing
+embedding. Five suites are run:
+
+  fetch  DataFetcher.fetch_topic_data against the stub, sequential and concurrent
+  parse  DataFetcher's single-pass response parser vs. the BeautifulSoup one, on
+         recorded responses (--responses) or NLM-style HTML rendered from the store
+  build  LLM_Memory_Creation's index build, from scratch and as a no-op re-run
+  chunking  the semantic chunker vs. the 512-character splitter: chunk count,
+         chunking + embedding time and topic hit rate of the top 3 chunks
+  qa     MedicalQA.answer_question over questions generated from the store.
+         Some topics are held out of the index, so their questions take the
+         refetch path; they are asked again after the background refresh.
+
+Results are printed and appended as one JSON line to --output, so runs can be
+compared over time.
+
+Usage:
+    python benchmark.py
+    python benchmark.py --suites qa --topics 40 --concurrency 8 --llm-latency 0.3
+"""
+
+import argparse
+import glob
+import html
+import json
+import os
+import random
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape, quoteattr
+
+import numpy as np
+import requests
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from article_store import ARTICLE_STORE_PATH, LEGACY_STORE_PATH, ArticleStore, read_topics
+from bm25_index import tokenize
+from embedding_pipeline import peak_memory_mb
+from topic_resolver import normalize, topic_aliases
+from tracing import tracer
+
+QUESTION_TEMPLATES = [
+    "What is {topic}?",
+    "What are the symptoms of {topic}?",
+    "How is {topic} treated?",
+    "What medicines are used for {topic}?",
+]
+
+# Chunks shorter than this don't count as retrieval hits in the chunking suite
+MIN_ANSWER_WORDS = 20
+
+
+class HashingEmbeddings(Embeddings):
+    """Deterministic bag-of-words embedding: tokens hashed into `dim` signed buckets."""
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in tokenize(text):
+            bucket = zlib.crc32(token.encode("utf-8"))
+            vector[bucket % self.dim] += 1.0 if bucket & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Deterministic stand-in for the Groq model. Answers from the prompt's
+    context when most of its chunks name the question's topic (or one of its
+    aliases, see topic_resolver.topic_aliases) and says
+    NEED_MORE_CONTEXT otherwise; topic-extraction prompts get the known topic named in the
+    question. Streaming waits `first_token_latency`, then `token_latency` per word.
+    """
+
+    topics: List[str] = []
+    first_token_latency: float = 0.2
+    token_latency: float = 0.01
+    answer_words: int = 40
+
+    @property
+    def _llm_type(self) -> str:
+        return "docbot-fake"
+
+    def _topic_in(self, text: str) -> Optional[str]:
+        text = text.casefold()
+        matches = [topic for topic in self.topics if topic.casefold() in text]
+        return max(matches, key=len) if matches else None
+
+    def _respond(self, prompt: str) -> str:
+        if "Extract the main medical condition" in prompt:
+            return self._topic_in(prompt.rsplit("Question:", 1)[-1]) or "None"
+
+        context, _, question = prompt.partition("Question:")
+        context = context.split("Context:", 1)[-1]
+        topic = self._topic_in(question)
+        chunks = [f" {normalize(chunk)} " for chunk in context.split("\n\n") if chunk.strip()]
+        aliases = topic_aliases(topic) if topic else []
+        on_topic = sum(any(f" {alias} " in chunk for alias in aliases) for chunk in chunks)
+        if topic is None or on_topic * 2 <= len(chunks):
+            return "NEED_MORE_CONTEXT"
+        return " ".join(context.split()[:self.answer_words])
+
+    def _generate(self, messages: List[BaseMessage], stop=None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs) -> ChatResult:
+        answer = self._respond(messages[-1].content)
+        time.sleep(self.first_token_latency + self.token_latency * max(0, len(answer.split()) - 1))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=answer))])
+
+    def _stream(self, messages: List[BaseMessage], stop=None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs):
+        words = self._respond(messages[-1].content).split(" ")
+        time.sleep(self.first_token_latency)
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else " " + word))
+
+
+def _as_html(text: str, highlight: str) -> str:
+    """Plain text as NLM-style HTML: a paragraph per three sentences, the search term in <span class="qt0">."""
+    sentences = re.split(r"(?<=\.) ", html.escape(text, quote=False))
+    paragraphs = [" ".join(sentences[i:i + 3]) for i in range(0, len(sentences), 3)]
+    marked = "".join(f"<p>{paragraph}</p>" for paragraph in paragraphs)
+    if highlight:
+        marked = re.sub(re.escape(html.escape(highlight, quote=False)), lambda m: f'<span class="qt0">{m.group(0)}</span>',
+                        marked, flags=re.IGNORECASE)
+    return marked
+
+
+def render_search_xml(articles: List[Dict], highlight: Optional[str] = None) -> bytes:
+    """
+    Articles in the shape of a MedlinePlus web service search result. With
+    `highlight` the fields are HTML like NLM's (see _as_html) instead of text.
+    """
+    documents = []
+    for rank, article in enumerate(articles):
+        contents = "".join(
+            f'<content name="{name}">'
+            f'{escape(_as_html(article.get(key, ""), highlight) if highlight else escape(article.get(key, "")))}'
+            f'</content>'
+            for name, key in (("title", "title"), ("snippet", "snippet"), ("FullSummary", "full_text"))
+        )
+        documents.append(f'<document rank="{rank}" url={quoteattr(article["url"])}>{contents}</document>')
+    body = f'<list num="{len(documents)}">{"".join(documents)}</list>'
+    return f'<?xml version="1.0" encoding="UTF-8"?><nlmSearchResult>{body}</nlmSearchResult>'.encode("utf-8")
+
+
+class StubMedlinePlusServer:
+    """
+    Local HTTP server answering DataFetcher's queries from an article store.
+    `latency` delays every response; `error_rate` answers that fraction with a
+    503 so the retry path is exercised. Responses carry an ETag and
+    If-None-Match is answered with 304, like a conditional GET against NLM.
+    """
+
+    def __init__(self, store: Dict[str, Dict], latency: float = 0.0, error_rate: float = 0.0, seed: int = 0):
+        self.responses: Dict[Tuple[str, str], bytes] = {}
+        for topic, content in store.items():
+            for key in ("health_articles", "drug_articles"):
+                self.responses[(topic.casefold(), key)] = render_search_xml(content.get(key, []))
+        self.empty = render_search_xml([])
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests = 0
+        self.not_modified = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def respond(self, term: str) -> Tuple[int, bytes]:
+        with self._lock:
+            self.requests += 1
+            fail = self._random.random() < self.error_rate
+        if fail:
+            return 503, b""
+        phrase = re.match(r'\s*"([^"]*)"', term)
+        topic = phrase.group(1) if phrase else term
+        key = "health_articles"
+        for suffix in (" medicines", " drugs"):
+            if topic.endswith(suffix):
+                topic, key = topic[:-len(suffix)], "drug_articles"
+        return 200, self.responses.get((topic.casefold(), key), self.empty)
+
+    def start(self) -> str:
+        """Start serving on a free port; returns the base URL for DataFetcher."""
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if stub.latency:
+                    time.sleep(stub.latency)
+                term = parse_qs(urlparse(self.path).query).get("term", [""])[0]
+                status, body = stub.respond(term)
+                etag = f'"{zlib.crc32(body):08x}"'
+                if status == 200 and self.headers.get("If-None-Match") == etag:
+                    status, body = 304, b""
+                    with stub._lock:
+                        stub.not_modified += 1
+                self.send_response(status)
+                self.send_header("Content-Type", "text/xml; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                if status in (200, 304):
+                    self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self._server.serve_forever, name="medlineplus-stub", daemon=True).start()
+        return f"http://127.0.0.1:{self._server.server_port}/ws/query?db=healthTopics&term="
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+def latency_summary(seconds: List[float]) -> Dict[str, float]:
+    if not seconds:
+        return {}
+    values = np.asarray(seconds) * 1000
+    return {
+        "count": len(values),
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "max_ms": float(values.max()),
+    }
+
+
+def make_questions(topics: List[str], per_topic: int) -> List[Tuple[str, str]]:
+    """(topic, question) pairs, `per_topic` templates per topic."""
+    return [(topic, template.format(topic=topic)) for topic in topics for template in QUESTION_TEMPLATES[:per_topic]]
+
+
+def bench_fetch(base_url: str, topics: List[str], workers: int, requests_per_second: float,
+                stub: Optional["StubMedlinePlusServer"] = None) -> Dict:
+    """
+    Sequential vs. concurrent fetches without a response cache, then concurrent
+    fetches through one: filling it, fresh hits, and revalidation (ttl=0).
+    """
+    from data_fetcher import DataFetcher
+    from http_cache import ResponseCache
+
+    cache = ResponseCache("bench_http_cache.sqlite")
+    runs = [
+        ("sequential", False, False), ("concurrent", True, False),
+        ("cache_fill", True, cache), ("cache_fresh", True, cache), ("cache_revalidate", True, cache),
+    ]
+    results = {}
+    for name, concurrent, run_cache in runs:
+        if name == "cache_revalidate":
+            cache.ttl = cache.negative_ttl = 0
+        tracer.reset()
+        requests_before = stub.requests if stub else 0
+        fetcher = DataFetcher(topics, base_url=base_url, max_workers=workers,
+                              requests_per_second=requests_per_second, cache=run_cache)
+        start = time.perf_counter()
+        data = fetcher.fetch_topic_data(concurrent=concurrent)
+        elapsed = time.perf_counter() - start
+        queries = 2 * len(topics)
+        totals = tracer.totals()
+        results[name] = {
+            "seconds": elapsed,
+            "queries_per_second": queries / elapsed,
+            "articles": sum(len(articles) for content in data.values() for articles in content.values()),
+            "retries": totals.get("http_retries", 0),
+            "http_requests": (stub.requests - requests_before) if stub else None,
+            "cache_hits": totals.get("http_cache_hits", 0),
+            "revalidated": totals.get("http_cache_revalidated", 0),
+            "stages_ms": tracer.percentiles(),
+        }
+    return results
+
+
+def record_responses(topics: List[str], directory: str) -> List[bytes]:
+    """Fetch the topics' raw search results from MedlinePlus itself and save them as .xml files."""
+    from data_fetcher import DataFetcher
+
+    os.makedirs(directory, exist_ok=True)
+    fetcher = DataFetcher(topics, base_url=DataFetcher.BASE_URL, cache=False)
+    responses = []
+    for topic in topics:
+        for key, query in fetcher._topic_queries(topic).items():
+            response = fetcher._get(f"{fetcher.base_url}{requests.utils.quote(query)}")
+            if response.status_code == 200:
+                name = re.sub(r"[^a-z0-9]+", "_", f"{topic}_{key}".casefold())
+                with open(os.path.join(directory, f"{name}.xml"), "wb") as f:
+                    f.write(response.content)
+                responses.append(response.content)
+    print(f"💾 Recorded {len(responses)} responses to {directory}")
+    return responses
+
+
+def bench_parse(responses: List[bytes], repeat: int = 3) -> Dict:
+    """DataFetcher's single-pass parser against the original BeautifulSoup one, on the same responses."""
+    import warnings
+    from bs4 import XMLParsedAsHTMLWarning
+    from data_fetcher import DataFetcher
+
+    warnings.filterwarnings("ignore", category=XMLParsedAsHTMLWarning)
+    fetcher = DataFetcher([], cache=False)
+    results = {"responses": len(responses), "megabytes": sum(map(len, responses)) / 1e6}
+    outputs = {}
+    for name, parse in (("soup", fetcher._parse_articles_soup), ("fast", fetcher._parse_articles)):
+        tracer.reset()
+        start = time.perf_counter()
+        for _ in range(repeat):
+            outputs[name] = [parse(content) for content in responses]
+        elapsed = (time.perf_counter() - start) / repeat
+        results[name] = {
+            "seconds": elapsed,
+            "ms_per_response": elapsed * 1000 / max(1, len(responses)),
+            "articles": sum(map(len, outputs[name])),
+            "fallbacks": tracer.totals().get("parse_fallbacks", 0) // repeat,
+        }
+    results["identical"] = outputs["soup"] == outputs["fast"]
+    results["speedup"] = results["soup"]["seconds"] / results["fast"]["seconds"]
+    return results
+
+
+def bench_build(store: Dict[str, Dict], embed_model, batch_size: int) -> Dict:
+    import LLM_Memory_Creation as build
+
+    article_store = ArticleStore(ARTICLE_STORE_PATH)
+    for topic, content in store.items():
+        article_store.append(topic, content)
+
+    def run(existing_db=None):
+        start = time.perf_counter()
+        chunks = build.chunk_documents(build.load_article_store(ARTICLE_STORE_PATH), embed_model=embed_model)
+        db, stats = build.sync_faiss_index(chunks, embed_model, existing_db, batch_size=batch_size)
+        return db, stats, len(chunks), time.perf_counter() - start
+
+    db, stats, n_chunks, elapsed = run()
+    _, noop_stats, _, noop_elapsed = run(build.load_existing_faiss(embed_model))
+    return {
+        "chunks": n_chunks,
+        "vectors": db.index.ntotal,
+        "seconds": elapsed,
+        "chunks_per_second": n_chunks / elapsed,
+        "noop_rebuild_seconds": noop_elapsed,
+        "noop_rebuild_new_chunks": noop_stats["new"],
+        "peak_memory_mb": peak_memory_mb(),
+    }
+
+
+def bench_chunking(store: Dict[str, Dict], embed_model, per_topic: int, k: int = 3) -> Dict:
+    """
+    Index the store with each chunker and ask the generated questions. A hit is
+    a top-k result (dense only, and hybrid with BM25) from the question's topic
+    with at least MIN_ANSWER_WORDS words; a title on its own matches "What is
+    X?" well but answers nothing.
+    """
+    import LLM_Memory_Creation as build
+    from langchain_community.vectorstores import FAISS
+    from bm25_index import BM25Index
+    from retrieval import HybridRetriever, dense_search_batch
+
+    documents = [doc for topic, content in store.items() for doc in build.articles_to_documents(topic, content)]
+    questions = make_questions(list(store), per_topic)
+    question_vectors = embed_model.embed_documents([question for _, question in questions])
+    results = {}
+    for method in ("recursive", "semantic"):
+        start = time.perf_counter()
+        chunks = build.chunk_documents(documents, embed_model=embed_model, method=method)
+        chunk_seconds = time.perf_counter() - start
+        unique = {build.chunk_id(chunk): chunk for chunk in chunks}
+        ids, texts = list(unique), [chunk.page_content for chunk in unique.values()]
+        start = time.perf_counter()
+        db = FAISS.from_embeddings(list(zip(texts, embed_model.embed_documents(texts))), embed_model,
+                                   metadatas=[chunk.metadata for chunk in unique.values()], ids=ids)
+        embed_seconds = time.perf_counter() - start
+        bm25 = BM25Index()
+        bm25.add(ids, texts)
+        retriever = HybridRetriever(vectorstore=db, bm25=bm25, k=k)
+
+        def hit_rate(rankings: List[List[Document]]) -> float:
+            hits = sum(
+                any(
+                    doc.metadata.get("topic") == topic and len(doc.page_content.split()) >= MIN_ANSWER_WORDS
+                    for doc in docs
+                )
+                for (topic, _), docs in zip(questions, rankings)
+            )
+            return hits / len(questions)
+
+        dense = [
+            [db.docstore.search(doc_id) for doc_id, _ in row]
+            for row in dense_search_batch(db, question_vectors, k)
+        ]
+        results[method] = {
+            "chunks": len(chunks),
+            "mean_chunk_chars": sum(map(len, texts)) / len(texts),
+            "short_chunks": sum(len(text.split()) < MIN_ANSWER_WORDS for text in texts),
+            "chunk_seconds": chunk_seconds,
+            "embed_index_seconds": embed_seconds,
+            "dense_hit_rate": hit_rate(dense),
+            "hybrid_hit_rate": hit_rate(retriever.retrieve_batch([q for _, q in questions], question_vectors)),
+        }
+    return results
+
+
+def bench_qa(topics: List[str], held_out: List[str], llm: FakeChatModel, embed_model,
+             per_topic: int, concurrency: int) -> Dict:
+    from LLM_Connect_Memory import MedicalQA
+
+    qa = MedicalQA(llm=llm, embedding_model=embed_model)
+    held_out_keys = {topic.casefold() for topic in held_out}
+
+    def ask(item: Tuple[str, str]) -> Tuple[str, str, str, float]:
+        topic, question = item
+        start = time.perf_counter()
+        answer = qa.answer_question(question)
+        return topic, question, answer, time.perf_counter() - start
+
+    def run_pass(items: List[Tuple[str, str]]) -> Tuple[List, float]:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(ask, items))
+        return results, time.perf_counter() - start
+
+    def outcome(answer: str) -> str:
+        if answer.startswith("I don't have enough information about"):
+            return "refresh_queued"
+        if answer.startswith("I apologize"):
+            return "unanswered"
+        return "answered"
+
+    def summarize(results: List, elapsed: float) -> Dict:
+        outcomes: Dict[str, int] = {}
+        for _, _, answer, _ in results:
+            outcomes[outcome(answer)] = outcomes.get(outcome(answer), 0) + 1
+        return {
+            "questions": len(results),
+            "seconds": elapsed,
+            "questions_per_second": len(results) / elapsed if elapsed else 0.0,
+            "latency": latency_summary([seconds for *_, seconds in results]),
+            "outcomes": outcomes,
+        }
+
+    questions = make_questions(topics, per_topic)
+    random.Random(0).shuffle(questions)
+
+    tracer.reset()
+    cold, cold_elapsed = run_pass(questions)
+    cold_stages = tracer.percentiles()
+
+    refresh_start = time.perf_counter()
+    qa.refresher.join()
+    refresh_wait = time.perf_counter() - refresh_start
+
+    # Refetch path: were questions the index couldn't answer answerable after their topic was fetched?
+    missed = [(topic, question) for topic, question, answer, _ in cold if outcome(answer) != "answered"]
+    retried, retried_elapsed = run_pass(missed)
+    refetch_hits = sum(outcome(answer) == "answered" for _, _, answer, _ in retried)
+
+    cache_hits_before = qa.answer_cache.stats["hits"]
+    repeated, repeated_elapsed = run_pass([item for item in questions if item[0].casefold() not in held_out_keys])
+
+    return {
+        "cold": {**summarize(cold, cold_elapsed), "stages_ms": cold_stages},
+        "after_refresh": summarize(retried, retried_elapsed),
+        "repeat": summarize(repeated, repeated_elapsed),
+        "refetch": {
+            "held_out_topics": len(held_out),
+            "refresh_wait_seconds": refresh_wait,
+            "hits": refetch_hits,
+            "misses": len(retried) - refetch_hits,
+            "hit_rate": refetch_hits / len(retried) if retried else None,
+            "refresher": dict(qa.refresher.stats),
+        },
+        "answer_cache": {**qa.answer_cache.stats, "repeat_hits": qa.answer_cache.stats["hits"] - cache_hits_before},
+        "topic_resolver": dict(qa.topic_resolver.stats),
+        "peak_memory_mb": peak_memory_mb(),
+    }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(results: Dict):
+    fetch = results.get("fetch")
+    if fetch:
+        print("\n📡 Fetch")
+        for mode, row in fetch.items():
+            print(f"   {mode:<16} {row['seconds']:7.2f}s  {row['queries_per_second']:7.1f} queries/s  "
+                  f"{row['articles']} articles, {row['http_requests']} requests, {row['retries']} retries, "
+                  f"{row['cache_hits']} cache hits, {row['revalidated']} revalidated")
+    parse = results.get("parse")
+    if parse:
+        print(f"\n🧾 Parse ({parse['responses']} responses, {parse['megabytes']:.1f} MB)")
+        for mode in ("soup", "fast"):
+            row = parse[mode]
+            print(f"   {mode:<5} {row['seconds'] * 1000:8.1f} ms  {row['ms_per_response']:6.2f} ms/response  "
+                  f"{row['articles']} articles, {row['fallbacks']} fallbacks")
+        print(f"   {parse['speedup']:.1f}x faster, identical output: {parse['identical']}")
+    build = results.get("build")
+    if build:
+        print("\n🏗️ Build")
+        print(f"   {build['chunks']} chunks in {build['seconds']:.2f}s ({build['chunks_per_second']:.0f} chunks/s), "
+              f"no-op rebuild {build['noop_rebuild_seconds']:.2f}s")
+    chunking = results.get("chunking")
+    if chunking:
+        print("\n🧩 Chunking")
+        for method, row in chunking.items():
+            print(f"   {method:<10} {row['chunks']:6d} chunks ({row['mean_chunk_chars']:.0f} chars, "
+                  f"{row['short_chunks']} under {MIN_ANSWER_WORDS} words)  "
+                  f"chunk {row['chunk_seconds']:6.2f}s  embed+index {row['embed_index_seconds']:6.2f}s  "
+                  f"hit@3 dense {row['dense_hit_rate']:.1%}  hybrid {row['hybrid_hit_rate']:.1%}")
+    qa = results.get("qa")
+    if qa:
+        print("\n💬 QA")
+        for phase in ("cold", "after_refresh", "repeat"):
+            row = qa[phase]
+            latency = row["latency"]
+            if not latency:
+                continue
+            print(f"   {phase:<13} {row['questions']:4d} q  {row['questions_per_second']:6.1f} q/s  "
+                  f"p50 {latency['p50_ms']:6.0f} ms  p95 {latency['p95_ms']:6.0f} ms  p99 {latency['p99_ms']:6.0f} ms  "
+                  f"{row['outcomes']}")
+        refetch = qa["refetch"]
+        print(f"   refetch hits {refetch['hits']}, misses {refetch['misses']}, "
+              f"answer cache {qa['answer_cache']}")
+    print(f"\n🧠 Peak memory: {results.get('peak_memory_mb') or 0:.0f} MB")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run DocBot's offline benchmarks.")
+    parser.add_argument("--suites", default="fetch,parse,build,chunking,qa", help="Comma-separated suites to run.")
+    parser.add_argument("--store", default=LEGACY_STORE_PATH,
+                        help="Article store (.json, or an ArticleStore .jsonl) to serve and index.")
+    parser.add_argument("--topics", type=int, default=30, help="Number of topics from the store to use.")
+    parser.add_argument("--holdout", type=float, default=0.2, help="Fraction of topics left out of the index.")
+    parser.add_argument("--questions-per-topic", type=int, default=2, choices=range(1, len(QUESTION_TEMPLATES) + 1))
+    parser.add_argument("--concurrency", type=int, default=4, help="Questions answered at once.")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Fake LLM time to first token (s).")
+    parser.add_argument("--token-latency", type=float, default=0.01, help="Fake LLM time per token (s).")
+    parser.add_argument("--server-latency", type=float, default=0.05, help="Stub MedlinePlus latency (s).")
+    parser.add_argument("--server-error-rate", type=float, default=0.0, help="Fraction of stub responses that are 503.")
+    parser.add_argument("--fetch-workers", type=int, default=8)
+    parser.add_argument("--requests-per-second", type=float, default=1000.0, help="DataFetcher rate limit.")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--responses", default=None,
+                        help="Directory of recorded MedlinePlus responses (*.xml) for the parse suite; "
+                             "by default responses are rendered from the store with NLM-style HTML.")
+    parser.add_argument("--record-responses", action="store_true",
+                        help="Fetch the topics from MedlinePlus into --responses first (needs network).")
+    parser.add_argument("--embeddings", choices=["hashing", "huggingface"], default="hashing",
+                        help="hashing is offline and deterministic; huggingface uses the real model.")
+    parser.add_argument("--rerank", action="store_true",
+                        help="Re-rank retrieved chunks with the cross-encoder (downloads it on first use).")
+    parser.add_argument("--output", default="benchmark_results.jsonl", help="JSONL file results are appended to.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    suites = [suite.strip() for suite in args.suites.split(",") if suite.strip()]
+    output_path = os.path.abspath(args.output)
+    responses_dir = os.path.abspath(args.responses) if args.responses else None
+    full_store = read_topics(args.store)
+
+    topics = [topic for topic, content in full_store.items() if any(content.values())][:args.topics]
+    store = {topic: full_store[topic] for topic in topics}
+    held_out = topics[::max(1, round(1 / args.holdout))] if args.holdout > 0 else []
+    indexed_store = {topic: content for topic, content in store.items() if topic not in held_out}
+
+    if args.embeddings == "hashing":
+        embed_model = HashingEmbeddings()
+    else:
+        from embedding_cache import get_embedding_model
+        embed_model = get_embedding_model()
+    llm = FakeChatModel(topics=topics, first_token_latency=args.llm_latency, token_latency=args.token_latency)
+
+    stub = StubMedlinePlusServer(store, latency=args.server_latency, error_rate=args.server_error_rate)
+    base_url = stub.start()
+    os.environ["MEDLINEPLUS_BASE_URL"] = base_url
+    os.environ["DOCBOT_RERANK"] = "1" if args.rerank else "0"
+    tracer.enabled, tracer.path = True, None
+
+    workdir = tempfile.mkdtemp(prefix="docbot-bench-")
+    cwd = os.getcwd()
+    results: Dict = {}
+    try:
+        # Index paths are relative, so every suite writes into the scratch directory
+        os.chdir(workdir)
+        if "fetch" in suites:
+            print("📡 Benchmarking DataFetcher...")
+            results["fetch"] = bench_fetch(base_url, topics, args.fetch_workers, args.requests_per_second, stub)
+        if "parse" in suites:
+            print("🧾 Benchmarking response parsing...")
+            if args.responses and args.record_responses:
+                responses = record_responses(topics, responses_dir)
+            elif args.responses:
+                responses = []
+                for path in sorted(glob.glob(os.path.join(responses_dir, "*.xml"))):
+                    with open(path, "rb") as f:
+                        responses.append(f.read())
+            else:
+                responses = [
+                    render_search_xml(content.get(key, []), highlight=topic)
+                    for topic, content in store.items() for key in ("health_articles", "drug_articles")
+                ]
+            results["parse"] = bench_parse(responses)
+        if "build" in suites or "qa" in suites:
+            print("🏗️ Benchmarking index build...")
+            build_results = bench_build(indexed_store, embed_model, args.batch_size)
+            if "build" in suites:
+                results["build"] = build_results
+        if "chunking" in suites:
+            print("🧩 Benchmarking chunkers...")
+            results["chunking"] = bench_chunking(indexed_store, embed_model, len(QUESTION_TEMPLATES))
+        if "qa" in suites:
+            print("💬 Benchmarking MedicalQA...")
+            results["qa"] = bench_qa(topics, held_out, llm, embed_model, args.questions_per_topic, args.concurrency)
+    finally:
+        os.chdir(cwd)
+        stub.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    results["peak_memory_mb"] = peak_memory_mb()
+    print_report(results)
+
+    record = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "revision": git_revision(),
+        "params": vars(args),
+        "results": results,
+    }
+    with open(output_path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+    print(f"📝 Results appended to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
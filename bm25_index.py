@@ -0,0 +1,132 @@
+"""
+This module contains the BM25Index class, a small inverted index used next to
+FAISS so exact terms (drug names, abbreviations like "PCOS" or "COPD") are
+matched even when the dense embedding misses them.
+"""
+
+import heapq
+import json
+import math
+import os
+import re
+from collections import Counter
+from typing import Container, Dict, Iterable, List, Optional, Sequence, Tuple
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from has have how i if in into is it its me my
+of on or so such that the their then there these they this to was what when where which who
+why will with you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase alphanumeric tokens with common English stopwords removed."""
+    return [token for token in TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Okapi BM25 over chunk texts, keyed by the same docstore ids as FAISS.
+    Postings are term -> [(doc position, term frequency), ...].
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_ids: List[str] = []
+        self.doc_lens: List[int] = []
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self._total_len = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def add(self, ids: Sequence[str], texts: Sequence[str]):
+        for doc_id, text in zip(ids, texts):
+            position = len(self.doc_ids)
+            tokens = tokenize(text)
+            self.doc_ids.append(doc_id)
+            self.doc_lens.append(len(tokens))
+            self._total_len += len(tokens)
+            for term, tf in Counter(tokens).items():
+                self.postings.setdefault(term, []).append((position, tf))
+
+    def search(self, query: str, k: int = 20, allowed: Optional[Container[str]] = None) -> List[Tuple[str, float]]:
+        """
+        Return up to k (doc_id, score) pairs, best first. With `allowed` only
+        those doc ids are scored (term statistics stay corpus-wide).
+        """
+        if not self.doc_ids:
+            return []
+        n_docs = len(self.doc_ids)
+        avg_len = self._total_len / n_docs or 1.0
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            df = len(postings)
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for position, tf in postings:
+                if allowed is not None and self.doc_ids[position] not in allowed:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lens[position] / avg_len)
+                scores[position] = scores.get(position, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(self.doc_ids[position], score) for position, score in best]
+
+    def copy(self) -> "BM25Index":
+        """Copy that can be extended while this one keeps serving."""
+        clone = BM25Index(self.k1, self.b)
+        clone.doc_ids = list(self.doc_ids)
+        clone.doc_lens = list(self.doc_lens)
+        clone.postings = {term: list(postings) for term, postings in self.postings.items()}
+        clone._total_len = self._total_len
+        return clone
+
+    @classmethod
+    def from_faiss(cls, db) -> "BM25Index":
+        """Build an index over every chunk in a FAISS store's docstore."""
+        index = cls()
+        ids = list(db.index_to_docstore_id.values())
+        index.add(ids, [db.docstore.search(doc_id).page_content for doc_id in ids])
+        return index
+
+    def save(self, path: str):
+        data = {
+            "k1": self.k1,
+            "b": self.b,
+            "doc_ids": self.doc_ids,
+            "doc_lens": self.doc_lens,
+            "postings": {term: [list(column) for column in zip(*postings)] for term, postings in self.postings.items()},
+        }
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["BM25Index"]:
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls(data["k1"], data["b"])
+        index.doc_ids = data["doc_ids"]
+        index.doc_lens = data["doc_lens"]
+        index.postings = {term: list(zip(*columns)) for term, columns in data["postings"].items()}
+        index._total_len = sum(index.doc_lens)
+        return index
+
+
+def reciprocal_rank_fusion(rankings: Iterable[Sequence[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Fuse ranked id lists: score(d) = sum over lists of 1 / (k + rank of d).
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
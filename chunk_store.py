@@ -0,0 +1,227 @@
+"""
+This module contains the on-disk chunk store that replaces FAISS's pickled
+docstore (index.pkl).
+
+  chunks.txt     every chunk's text, UTF-8, back to back
+  chunks.sqlite  per chunk: FAISS position, docstore id, byte offset/length in
+                 chunks.txt and metadata as [key id, value id] pairs into an
+                 interned string table (topics, urls and sources repeat a lot)
+
+Both files are written once and renamed into place, so readers open them
+immutable and only read the text of the chunks they are asked for. A write
+stores a random generation id in chunks.sqlite and at the start of chunks.txt;
+a reader that opens files from two different writes (a writer is between its
+two renames) sees the ids differ and opens them again.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from langchain_core.documents import Document
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_community.docstore.in_memory import InMemoryDocstore
+
+CHUNK_DB_NAME = "chunks.sqlite"
+CHUNK_TEXT_NAME = "chunks.txt"
+GENERATION_BYTES = 32  # uuid4().hex
+OPEN_ATTEMPTS = 50
+
+
+class ChunkStore:
+    """
+    Read-only view of a written chunk store. Lookups fetch one row and read the
+    text with a positioned read; recently used documents are kept in an LRU.
+    """
+
+    def __init__(self, folder: str, cache_size: int = 1024):
+        self.folder = folder
+        self._conn, self._text_fd = self._open_pair(folder)
+        self._lock = threading.Lock()
+        self.strings: Dict[int, str] = dict(self._conn.execute("SELECT id, value FROM strings"))
+        self._cache: "OrderedDict[str, Document]" = OrderedDict()
+        self._cache_size = cache_size
+
+    @staticmethod
+    def _open_pair(folder: str) -> Tuple[sqlite3.Connection, int]:
+        """Open chunks.sqlite and chunks.txt from the same write."""
+        db_path = os.path.abspath(os.path.join(folder, CHUNK_DB_NAME))
+        for _ in range(OPEN_ATTEMPTS):
+            conn = sqlite3.connect(f"file:{db_path}?mode=ro&immutable=1", uri=True, check_same_thread=False)
+            text_fd = os.open(os.path.join(folder, CHUNK_TEXT_NAME), os.O_RDONLY)
+            has_generation = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'generation'"
+            ).fetchone()
+            if not has_generation:
+                return conn, text_fd  # written before generation ids
+            (generation,) = conn.execute("SELECT id FROM generation").fetchone()
+            if os.pread(text_fd, GENERATION_BYTES, 0) == generation.encode("ascii"):
+                return conn, text_fd
+            conn.close()
+            os.close(text_fd)
+            time.sleep(0.01)
+        raise RuntimeError(f"{CHUNK_DB_NAME} and {CHUNK_TEXT_NAME} in '{folder}' are from different writes")
+
+    @staticmethod
+    def exists(folder: str) -> bool:
+        return all(os.path.exists(os.path.join(folder, name)) for name in (CHUNK_DB_NAME, CHUNK_TEXT_NAME))
+
+    def index_to_docstore_id(self) -> Dict[int, str]:
+        with self._lock:
+            return dict(self._conn.execute("SELECT position, doc_id FROM chunks ORDER BY position"))
+
+    def _decode_metadata(self, meta: str) -> Dict:
+        return {self.strings[key]: json.loads(self.strings[value]) for key, value in json.loads(meta)}
+
+    def get(self, doc_id: str) -> Optional[Document]:
+        with self._lock:
+            doc = self._cache.get(doc_id)
+            if doc is not None:
+                self._cache.move_to_end(doc_id)
+                return doc
+            row = self._conn.execute("SELECT offset, length, meta FROM chunks WHERE doc_id = ?", (doc_id,)).fetchone()
+        if row is None:
+            return None
+
+        offset, length, meta = row
+        text = os.pread(self._text_fd, length, offset).decode("utf-8")
+        doc = Document(page_content=text, metadata=self._decode_metadata(meta))
+        with self._lock:
+            self._cache[doc_id] = doc
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return doc
+
+    def metadata_values(self, key: str) -> Dict[str, object]:
+        """{doc_id: metadata[key]} for every chunk that has `key`, without reading any text."""
+        key_id = next((string_id for string_id, value in self.strings.items() if value == key), None)
+        if key_id is None:
+            return {}
+        values = {}
+        with self._lock:
+            rows = self._conn.execute("SELECT doc_id, meta FROM chunks").fetchall()
+        for doc_id, meta in rows:
+            for pair_key, value_id in json.loads(meta):
+                if pair_key == key_id:
+                    values[doc_id] = json.loads(self.strings[value_id])
+        return values
+
+    def close(self):
+        self._conn.close()
+        os.close(self._text_fd)
+
+
+class LazyDocstore(Docstore, AddableMixin):
+    """
+    Docstore backed by a ChunkStore, with documents added or deleted since it
+    was loaded kept in memory until the next write.
+    """
+
+    def __init__(self, store: Optional[ChunkStore] = None):
+        self.store = store
+        self._added: Dict[str, Document] = {}
+        self._deleted: Set[str] = set()
+
+    def search(self, search: str) -> Union[str, Document]:
+        if search in self._added:
+            return self._added[search]
+        if search not in self._deleted and self.store is not None:
+            doc = self.store.get(search)
+            if doc is not None:
+                return doc
+        return f"ID {search} not found."
+
+    def _contains(self, doc_id: str) -> bool:
+        return isinstance(self.search(doc_id), Document)
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        overlapping = {doc_id for doc_id in texts if self._contains(doc_id)}
+        if overlapping:
+            raise ValueError(f"Tried to add ids that already exist: {overlapping}")
+        self._added.update(texts)
+        self._deleted.difference_update(texts)
+
+    def delete(self, ids: List) -> None:
+        for doc_id in ids:
+            self._added.pop(doc_id, None)
+            self._deleted.add(doc_id)
+
+    def copy(self) -> "LazyDocstore":
+        """Copy sharing the on-disk store; changes to either stay separate."""
+        clone = LazyDocstore(self.store)
+        clone._added = dict(self._added)
+        clone._deleted = set(self._deleted)
+        return clone
+
+    def metadata_values(self, key: str) -> Dict[str, object]:
+        values = self.store.metadata_values(key) if self.store is not None else {}
+        for doc_id in self._deleted:
+            values.pop(doc_id, None)
+        for doc_id, doc in self._added.items():
+            if key in doc.metadata:
+                values[doc_id] = doc.metadata[key]
+        return values
+
+
+def copy_docstore(docstore: Docstore) -> Docstore:
+    """Copy of a FAISS docstore that can be added to without changing the original."""
+    if isinstance(docstore, LazyDocstore):
+        return docstore.copy()
+    return InMemoryDocstore(dict(docstore._dict))
+
+
+def write_chunk_store(folder: str, documents: Iterable[Tuple[int, str, Document]]):
+    """
+    Write (position, doc_id, Document) triples as a new chunk store and
+    replace the previous one. The database is renamed into place first, and
+    readers check both files carry the same generation id.
+    """
+    os.makedirs(folder, exist_ok=True)
+    db_path = os.path.join(folder, CHUNK_DB_NAME)
+    text_path = os.path.join(folder, CHUNK_TEXT_NAME)
+    tmp_db_path, tmp_text_path = f"{db_path}.tmp", f"{text_path}.tmp"
+    if os.path.exists(tmp_db_path):
+        os.remove(tmp_db_path)
+
+    conn = sqlite3.connect(tmp_db_path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("CREATE TABLE strings (id INTEGER PRIMARY KEY, value TEXT NOT NULL)")
+    conn.execute(
+        "CREATE TABLE chunks (position INTEGER PRIMARY KEY, doc_id TEXT NOT NULL UNIQUE, "
+        "offset INTEGER NOT NULL, length INTEGER NOT NULL, meta TEXT NOT NULL)"
+    )
+
+    generation = uuid.uuid4().hex
+    conn.execute("CREATE TABLE generation (id TEXT NOT NULL)")
+    conn.execute("INSERT INTO generation VALUES (?)", (generation,))
+
+    strings: Dict[str, int] = {}
+
+    def intern(value: str) -> int:
+        if value not in strings:
+            strings[value] = len(strings)
+        return strings[value]
+
+    rows = []
+    offset = GENERATION_BYTES
+    with open(tmp_text_path, "wb") as text_file:
+        text_file.write(generation.encode("ascii"))
+        for position, doc_id, doc in documents:
+            data = doc.page_content.encode("utf-8")
+            text_file.write(data)
+            meta = [[intern(key), intern(json.dumps(value, ensure_ascii=False))] for key, value in doc.metadata.items()]
+            rows.append((position, doc_id, offset, len(data), json.dumps(meta, separators=(",", ":"))))
+            offset += len(data)
+
+    conn.executemany("INSERT INTO chunks VALUES (?, ?, ?, ?, ?)", rows)
+    conn.executemany("INSERT INTO strings VALUES (?, ?)", [(string_id, value) for value, string_id in strings.items()])
+    conn.commit()
+    conn.close()
+
+    os.replace(tmp_db_path, db_path)
+    os.replace(tmp_text_path, text_path)
@@ -0,0 +1,166 @@
+"""
+This module contains the ContextPacker, which turns retrieved chunks into the
+prompt's context within a token budget.
+
+  - near-duplicates (MinHash estimate of word-shingle Jaccard similarity above
+    `similarity`) are dropped, keeping the better-ranked copy; repeated
+    ingestion and overlapping articles produce many of these
+  - chunks from the same article (URL, or PDF page) are placed together, and
+    neighbouring chunks are merged into one passage: consecutive `chunk_index`
+    values (set by chunk_documents), or texts that overlap (the recursive
+    splitter's chunk_overlap, also for chunks indexed before chunk_index)
+  - passages are added in rank order until `token_budget` is used; the one
+    that doesn't fit is cut at a sentence boundary
+
+Token counts are estimates (about 4 characters per token for English text),
+used for budgeting and reporting; the LLM's own prompt_tokens are traced
+separately.
+"""
+
+import math
+import re
+import zlib
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+CONTEXT_SEPARATOR = "\n\n"
+_WORD = re.compile(r"\w+")
+_SENTENCE_END = re.compile(r"[.!?](?=\s)|\n")
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / 4)
+
+
+class PackedContext(NamedTuple):
+    text: str
+    documents: List[Document]
+    tokens: int
+    raw_tokens: int
+    duplicates: int
+    merged: int
+    truncated: bool
+
+    @property
+    def saved_tokens(self) -> int:
+        return self.raw_tokens - self.tokens
+
+
+def _overlap(a: str, b: str, min_chars: int, max_chars: int) -> int:
+    """Length of the longest suffix of `a` that is a prefix of `b`, or 0."""
+    for length in range(min(len(a), len(b), max_chars), min_chars - 1, -1):
+        if a.endswith(b[:length]):
+            return length
+    return 0
+
+
+class ContextPacker:
+    def __init__(self, token_budget: int = 768, similarity: float = 0.8, num_perm: int = 64,
+                 shingle_size: int = 3, min_overlap: int = 20, max_overlap: int = 200, seed: int = 1):
+        self.token_budget = token_budget
+        self.similarity = similarity
+        self.shingle_size = shingle_size
+        self.min_overlap = min_overlap
+        self.max_overlap = max_overlap
+        rng = np.random.default_rng(seed)
+        # Multiply-shift hash family over 32-bit shingle hashes
+        self._a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        """MinHash signature of the text's word shingles."""
+        words = _WORD.findall(text.casefold())
+        n = self.shingle_size
+        shingles = {" ".join(words[i:i + n]) for i in range(max(1, len(words) - n + 1))}
+        hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+        return ((hashes[:, None] * self._a + self._b) >> np.uint64(32)).min(axis=0)
+
+    def _deduplicate(self, documents: List[Document]) -> List[Document]:
+        kept, signatures = [], []
+        for doc in documents:
+            signature = self.signature(doc.page_content)
+            if any(np.mean(signature == other) >= self.similarity for other in signatures):
+                continue
+            kept.append(doc)
+            signatures.append(signature)
+        return kept
+
+    def _join(self, first: Document, first_last: Optional[int], second: Document,
+              second_first: Optional[int]) -> Optional[str]:
+        """`first` followed by `second` as one passage, if they are neighbours in their document."""
+        length = _overlap(first.page_content, second.page_content, self.min_overlap, self.max_overlap)
+        if length:
+            return first.page_content + second.page_content[length:]
+        if first_last is not None and second_first == first_last + 1:
+            return f"{first.page_content} {second.page_content}"
+        return None
+
+    def _merge_neighbours(self, documents: List[Document]) -> List[Document]:
+        """Group chunks by article (in rank order of each article's best chunk) and join neighbouring ones."""
+        groups: dict = {}
+        for doc in documents:
+            key = (doc.metadata.get("url") or doc.metadata.get("source") or id(doc), doc.metadata.get("page"))
+            index = doc.metadata.get("chunk_index")
+            # (passage, chunk_index of its first chunk, of its last chunk)
+            groups.setdefault(key, []).append((doc, index, index))
+
+        passages = []
+        for group in groups.values():
+            merged = True
+            while merged and len(group) > 1:
+                merged = False
+                for i, (first, first_start, first_last) in enumerate(group):
+                    for j, (second, second_first, second_last) in enumerate(group):
+                        if i == j:
+                            continue
+                        text = self._join(first, first_last, second, second_first)
+                        if text is not None:
+                            keep = min(i, j)
+                            group[keep] = (Document(page_content=text, metadata=group[keep][0].metadata),
+                                           first_start, second_last)
+                            del group[max(i, j)]
+                            merged = True
+                            break
+                    if merged:
+                        break
+            passages.extend(doc for doc, _, _ in group)
+        return passages
+
+    def _truncate(self, text: str, tokens: int) -> Optional[str]:
+        """`text` cut at the last sentence end within `tokens`, or None if no sentence fits."""
+        head = text[:tokens * 4]
+        ends = [match.end() for match in _SENTENCE_END.finditer(head)]
+        return head[:ends[-1]].rstrip() if ends else None
+
+    def pack(self, documents: List[Document]) -> PackedContext:
+        raw_tokens = estimate_tokens(CONTEXT_SEPARATOR.join(doc.page_content for doc in documents))
+        unique = self._deduplicate(documents)
+        passages = self._merge_neighbours(unique)
+
+        packed, used, truncated = [], 0, False
+        for doc in passages:
+            cost = estimate_tokens(doc.page_content) + (1 if packed else 0)
+            if used + cost <= self.token_budget:
+                packed.append(doc)
+                used += cost
+                continue
+            text = self._truncate(doc.page_content, self.token_budget - used)
+            if not text and not packed:
+                text = doc.page_content[:self.token_budget * 4]
+            if text:
+                packed.append(Document(page_content=text, metadata=doc.metadata))
+            truncated = True
+            break
+
+        text = CONTEXT_SEPARATOR.join(doc.page_content for doc in packed)
+        return PackedContext(
+            text=text,
+            documents=packed,
+            tokens=estimate_tokens(text),
+            raw_tokens=raw_tokens,
+            duplicates=len(documents) - len(unique),
+            merged=len(unique) - len(passages),
+            truncated=truncated,
+        )
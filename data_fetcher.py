@@ -4,17 +4,227 @@ MedlinePlus API for popular health topics and their associated drug-related info
 """
 
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
-from typing import List, Dict
-import json
+from bs4.dammit import EntitySubstitution
+from lxml import etree
+from article_store import ArticleStore, open_article_store
+from http_cache import ResponseCache, get_response_cache
+from concurrent.futures import ThreadPoolExecutor
+from tracing import tracer
+from typing import List, Dict, Optional, Union
+import contextvars
+import hashlib
+import io
+import os
+import random
+import re
+import threading
 import time
 
+# Popular health topics the article store is built from
+TOP_TOPICS = [
+    "Diabetes", "Asthma", "Hypertension", "Depression", "Anxiety", "Heart Disease",
+    "Arthritis", "Obesity", "High Cholesterol", "Cancer", "COVID-19", "Flu (Influenza)",
+    "Pneumonia", "Stroke", "Migraine", "Alzheimer's Disease", "Parkinson's Disease",
+    "Chronic Pain", "Acid Reflux (GERD)", "Back Pain", "COPD", "Sleep Disorders",
+    "Allergies", "Autism", "Bipolar Disorder", "Breast Cancer", "Lung Cancer",
+    "Colon Cancer", "Prostate Cancer", "Skin Cancer", "UTI (Urinary Tract Infection)",
+    "Osteoporosis", "HIV/AIDS", "STDs", "ADHD", "Epilepsy", "Kidney Disease",
+    "Liver Disease", "Gallstones", "Appendicitis", "Celiac Disease", "Crohn's Disease",
+    "Ulcerative Colitis", "Diverticulitis", "Pancreatitis", "Hepatitis", "Tuberculosis",
+    "Sickle Cell Disease", "Anemia", "Thyroid Disorders", "Menopause", "Infertility",
+    "PCOS", "Endometriosis", "Pregnancy", "Prenatal Care", "Child Development",
+    "Vaccines", "Mental Health", "Dental Health", "Vision Problems", "Hearing Loss",
+    "Vertigo", "Sinusitis", "Tonsillitis", "Ear Infections", "Skin Conditions",
+    "Eczema", "Psoriasis", "Acne", "Warts", "Shingles", "Lupus", "Multiple Sclerosis",
+    "ALS", "Dementia", "Eating Disorders", "Bulimia", "Anorexia", "Substance Abuse",
+    "Alcohol Use Disorder", "Smoking Cessation", "Pain Management", "First Aid",
+    "Injuries", "Burns", "Fractures", "Sprains", "Exercise and Fitness", "Nutrition",
+    "Healthy Eating", "Weight Loss", "Childhood Obesity", "Men's Health", "Women's Health",
+    "Aging", "Grief", "Caregiving", "Medical Tests", "Blood Pressure", "Covid-19"
+]
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket used to rate-limit outgoing requests.
+    `rate` tokens are added per second, up to `capacity` tokens.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Block until a token is available and consume it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+# Fields of a search result <document> and the article keys they fill
+ARTICLE_FIELDS = {"title": "title", "snippet": "snippet", "FullSummary": "full_text"}
+
+# Markup the fast path strips itself: plain start/end tags and comments. Anything
+# else ("<" in text, CDATA, declarations, odd attribute syntax) goes to BeautifulSoup.
+_MARKUP = re.compile(
+    r"""<(?:(?P<name>[a-zA-Z][a-zA-Z0-9]*)"""
+    r"""(?:\s+[a-zA-Z_:][-a-zA-Z0-9_:.]*(?:\s*=\s*(?:"[^"<>]*"|'[^'<>]*'|[^\s"'<>=`]+))?)*\s*/?"""
+    r"""|/[a-zA-Z][a-zA-Z0-9]*\s*"""
+    r"""|!--(?![->])(?:[^-]|-(?!-))*--)>"""
+)
+_REFERENCE = re.compile(r"&(?:#([0-9]{1,7})|#[xX]([0-9a-fA-F]{1,6})|([a-zA-Z][a-zA-Z0-9]*));|&(?!\s)")
+# Elements whose content html.parser doesn't treat as markup, or that strip_html drops
+_RAW_TEXT_ELEMENTS = {"script", "style", "textarea", "title", "xmp", "iframe", "noembed", "noframes",
+                      "noscript", "plaintext"}
+
+
+class _NeedsSoup(Exception):
+    """Raised when a response has markup the fast parser does not reproduce exactly."""
+
+
+def _unescape_reference(match: "re.Match") -> str:
+    decimal, hexadecimal, name = match.groups()
+    if name is not None:
+        character = EntitySubstitution.HTML_ENTITY_TO_CHARACTER.get(name)
+        if character is None:
+            raise _NeedsSoup
+        return character
+    if decimal is None and hexadecimal is None:
+        raise _NeedsSoup  # a bare "&" html.parser might still read as a reference
+    codepoint = int(decimal, 10) if decimal is not None else int(hexadecimal, 16)
+    # Outside these ranges bs4 substitutes windows-1252 or U+FFFD characters
+    if codepoint in (9, 10, 13) or 0x20 <= codepoint < 0x7F or 0xA0 <= codepoint < 0xD800 \
+            or 0xE000 <= codepoint < 0xFFFE or 0x10000 <= codepoint <= 0x10FFFF:
+        return chr(codepoint)
+    raise _NeedsSoup
+
+
+def _strip_markup(html: str) -> str:
+    """
+    Same text as DataFetcher.strip_html (html.parser's text nodes, each
+    stripped, joined by spaces) in one regex pass; raises _NeedsSoup otherwise.
+    """
+    texts, position = [], 0
+    for match in _MARKUP.finditer(html):
+        texts.append(html[position:match.start()])
+        position = match.end()
+        if match.group("name") and match.group("name").lower() in _RAW_TEXT_ELEMENTS:
+            raise _NeedsSoup
+    texts.append(html[position:])
+
+    words = []
+    for text in texts:
+        if "<" in text:
+            raise _NeedsSoup
+        if "&" in text:
+            text = _REFERENCE.sub(_unescape_reference, text)
+        text = text.strip()
+        if text:
+            words.append(text)
+    return " ".join(words)
+
+
+def _parse_articles_fast(content: bytes) -> List[Dict]:
+    """Single lxml iterparse pass over a search result, stripping fields as documents complete."""
+    if b"<![CDATA[" in content or b"\r" in content:
+        raise _NeedsSoup  # parsed differently by the XML and HTML parsers
+    articles = []
+    try:
+        for _, doc in etree.iterparse(io.BytesIO(content), tag="document", resolve_entities=False):
+            fields: Dict[str, str] = {}
+            for field in doc.iter("content"):
+                name = field.get("name")
+                if name in ARTICLE_FIELDS and name not in fields:
+                    if len(field):
+                        raise _NeedsSoup  # unescaped child markup
+                    fields[name] = field.text or ""
+            url = doc.get("url")
+            if "title" in fields and url:
+                articles.append({
+                    key: _strip_markup(fields.get(name, "")) for name, key in ARTICLE_FIELDS.items()
+                } | {"url": url})
+            doc.clear(keep_tail=True)
+            while doc.getprevious() is not None:
+                del doc.getparent()[0]
+    except etree.XMLSyntaxError as e:
+        raise _NeedsSoup from e
+    return articles
+
 
 class DataFetcher:
     BASE_URL = "https://wsearch.nlm.nih.gov/ws/query?db=healthTopics&term="
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
 
-    def __init__(self, topics: List[str]):
+    def __init__(
+        self,
+        topics: List[str],
+        base_url: Optional[str] = None,
+        max_workers: int = 8,
+        requests_per_second: float = 4.0,
+        max_retries: int = 3,
+        backoff_factor: float = 0.5,
+        timeout: float = 15.0,
+        cache: Union[ResponseCache, bool] = True,
+    ):
+        """`cache=True` uses the shared response cache (see http_cache), False disables caching."""
         self.topics = topics
+        # MEDLINEPLUS_BASE_URL points every fetcher at a mirror or a local stub
+        self.base_url = base_url or os.getenv("MEDLINEPLUS_BASE_URL", self.BASE_URL)
+        self.max_workers = max(1, max_workers)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.timeout = timeout
+        self.rate_limiter = TokenBucket(requests_per_second)
+        self.session = self._create_session()
+        if isinstance(cache, ResponseCache):
+            self.cache: Optional[ResponseCache] = cache
+        else:
+            self.cache = get_response_cache() if cache else None
+
+    def _create_session(self) -> requests.Session:
+        """Create a keep-alive session whose pool fits every worker thread."""
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def _get(self, url: str, headers: Optional[Dict[str, str]] = None) -> requests.Response:
+        """
+        GET a URL through the shared session, honouring the rate limit.
+        Connection errors and retryable statuses are retried with exponential
+        backoff; the last response (or error) is returned (or raised).
+        """
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                tracer.count("http_retries")
+            with tracer.span("rate_limit_wait"):
+                self.rate_limiter.acquire()
+            try:
+                with tracer.span("medlineplus_http"):
+                    response = self.session.get(url, headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    raise
+            else:
+                if response.status_code not in self.RETRY_STATUSES or attempt == self.max_retries:
+                    return response
+            delay = self.backoff_factor * (2 ** attempt)
+            time.sleep(delay + random.uniform(0, delay / 2))
 
     def strip_html(self, html: str) -> str:
         """Clean HTML content by removing tags and normalizing whitespace."""
@@ -30,15 +240,67 @@ class DataFetcher:
         return text
 
     def fetch_articles(self, query: str) -> List[Dict]:
+        """
+        Articles matching a search query. Fresh cached results are returned
+        without a request; stale ones are revalidated, and served as they are
+        if NLM can't be reached.
+        """
         encoded_query = requests.utils.quote(query)
-        url = f"{self.BASE_URL}{encoded_query}"
-        response = requests.get(url)
+        url = f"{self.base_url}{encoded_query}"
+
+        cached = self.cache.get(url) if self.cache is not None else None
+        if cached is not None and cached.fresh:
+            tracer.count("http_cache_hits")
+            return cached.articles
+
+        try:
+            response = self._get(url, cached.validators() if cached is not None else None)
+        except (requests.ConnectionError, requests.Timeout):
+            if cached is None:
+                raise
+            print(f" Serving stale cached results for query: {query}")
+            return cached.articles
+
+        if response.status_code == 304 and cached is not None:
+            self.cache.revalidated(url)
+            tracer.count("http_cache_revalidated")
+            return cached.articles
 
         if response.status_code != 200:
+            if cached is not None:
+                print(f" Serving stale cached results for query: {query}")
+                return cached.articles
             print(f" Failed to fetch data for query: {query}")
             return []
 
-        soup = BeautifulSoup(response.content, "lxml")
+        body_hash = hashlib.sha256(response.content).hexdigest()
+        if cached is not None and cached.body_hash == body_hash:
+            # Same document without validators; skip the parse
+            articles = cached.articles
+            tracer.count("http_cache_revalidated")
+        else:
+            with tracer.span("medlineplus_parse"):
+                articles = self._parse_articles(response.content)
+        if self.cache is not None:
+            self.cache.put(
+                url, articles, response.headers.get("ETag"), response.headers.get("Last-Modified"), body_hash
+            )
+        return articles
+
+    def _parse_articles(self, content: bytes) -> List[Dict]:
+        """
+        Articles in a search result, via the single-pass parser when it can
+        reproduce _parse_articles_soup exactly, else via _parse_articles_soup.
+        """
+        try:
+            return _parse_articles_fast(content)
+        except _NeedsSoup:
+            tracer.count("parse_fallbacks")
+            return self._parse_articles_soup(content)
+
+    def _parse_articles_soup(self, content: bytes) -> List[Dict]:
+        """The original BeautifulSoup parser: four parses per article, but handles any markup."""
+        soup = BeautifulSoup(content, "lxml")
         articles = []
 
         for doc in soup.find_all("document"):
@@ -67,62 +329,74 @@ class DataFetcher:
 
         return articles
 
-    def fetch_topic_data(self) -> Dict[str, Dict[str, List[Dict]]]:
+    @staticmethod
+    def _topic_queries(topic: str) -> Dict[str, str]:
+        return {
+            "health_articles": f'"{topic}"',
+            "drug_articles": f'"{topic} medicines" OR "{topic} drugs"',
+        }
+
+    def fetch_topic_data(self, concurrent: bool = False,
+                         store: Optional[ArticleStore] = None) -> Dict[str, Dict[str, List[Dict]]]:
         """
         Fetches both general and drug-related articles for each topic.
         Returns a dictionary of all results.
+
+        With `concurrent=True` every query is fetched on a bounded thread pool
+        sharing one connection pool and rate limit; the result is the same
+        dictionary, in topic order. Each topic is appended to `store`, if
+        given, as soon as it is complete.
         """
+        if concurrent:
+            return self._fetch_topic_data_concurrent(store)
+
         all_data = {}
 
         for topic in self.topics:
             print(f"🔍 Fetching: {topic}")
             try:
-                health_query = f'"{topic}"'
-                drug_query = f'"{topic} medicines" OR "{topic} drugs"'
-
-                health_articles = self.fetch_articles(health_query)
-                drug_articles = self.fetch_articles(drug_query)
-
                 all_data[topic] = {
-                    "health_articles": health_articles,
-                    "drug_articles": drug_articles
+                    key: self.fetch_articles(query)
+                    for key, query in self._topic_queries(topic).items()
                 }
-
-                time.sleep(0.5)  # polite delay
+                if store is not None:
+                    store.append(topic, all_data[topic])
 
             except Exception as e:
                 print(f" Error fetching data for {topic}: {e}")
 
         return all_data
 
+    def _fetch_topic_data_concurrent(self, store: Optional[ArticleStore] = None) -> Dict[str, Dict[str, List[Dict]]]:
+        all_data = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                topic: {
+                    # Each task runs in a copy of this context, so its spans join the caller's trace
+                    key: executor.submit(contextvars.copy_context().run, self.fetch_articles, query)
+                    for key, query in self._topic_queries(topic).items()
+                }
+                for topic in self.topics
+            }
+
+            for topic, topic_futures in futures.items():
+                print(f"🔍 Fetching: {topic}")
+                try:
+                    all_data[topic] = {
+                        key: future.result() for key, future in topic_futures.items()
+                    }
+                    if store is not None:
+                        store.append(topic, all_data[topic])
+                except Exception as e:
+                    print(f" Error fetching data for {topic}: {e}")
+
+        return all_data
+
 
 if __name__ == "__main__":
-    top_topics = [
-        "Diabetes", "Asthma", "Hypertension", "Depression", "Anxiety", "Heart Disease",
-        "Arthritis", "Obesity", "High Cholesterol", "Cancer", "COVID-19", "Flu (Influenza)",
-        "Pneumonia", "Stroke", "Migraine", "Alzheimer's Disease", "Parkinson's Disease",
-        "Chronic Pain", "Acid Reflux (GERD)", "Back Pain", "COPD", "Sleep Disorders",
-        "Allergies", "Autism", "Bipolar Disorder", "Breast Cancer", "Lung Cancer",
-        "Colon Cancer", "Prostate Cancer", "Skin Cancer", "UTI (Urinary Tract Infection)",
-        "Osteoporosis", "HIV/AIDS", "STDs", "ADHD", "Epilepsy", "Kidney Disease",
-        "Liver Disease", "Gallstones", "Appendicitis", "Celiac Disease", "Crohn's Disease",
-        "Ulcerative Colitis", "Diverticulitis", "Pancreatitis", "Hepatitis", "Tuberculosis",
-        "Sickle Cell Disease", "Anemia", "Thyroid Disorders", "Menopause", "Infertility",
-        "PCOS", "Endometriosis", "Pregnancy", "Prenatal Care", "Child Development",
-        "Vaccines", "Mental Health", "Dental Health", "Vision Problems", "Hearing Loss",
-        "Vertigo", "Sinusitis", "Tonsillitis", "Ear Infections", "Skin Conditions",
-        "Eczema", "Psoriasis", "Acne", "Warts", "Shingles", "Lupus", "Multiple Sclerosis",
-        "ALS", "Dementia", "Eating Disorders", "Bulimia", "Anorexia", "Substance Abuse",
-        "Alcohol Use Disorder", "Smoking Cessation", "Pain Management", "First Aid",
-        "Injuries", "Burns", "Fractures", "Sprains", "Exercise and Fitness", "Nutrition",
-        "Healthy Eating", "Weight Loss", "Childhood Obesity", "Men's Health", "Women's Health",
-        "Aging", "Grief", "Caregiving", "Medical Tests", "Blood Pressure", "Covid-19"
-    ]
-
-    fetcher = DataFetcher(top_topics)
-    results = fetcher.fetch_topic_data()
-
-    with open("topic_article_store.json", "w", encoding="utf-8") as f:
-        json.dump(results, f, indent=2, ensure_ascii=False)
-
-    print(" All cleaned topic data saved to 'topic_article_store.json'")
+    fetcher = DataFetcher(TOP_TOPICS)
+    store = open_article_store()
+    results = fetcher.fetch_topic_data(concurrent=True, store=store)
+
+    print(f" {len(results)} cleaned topics appended to '{store.path}'")
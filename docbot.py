@@ -1,16 +1,30 @@
 import os
 import streamlit as st
-from LLM_Connect_Memory import MedicalQA
+import time
+from startup import print_report, start_service_warmup
+from tracing import tracer
 
 # Set up Streamlit page config
 st.set_page_config(page_title="DocBot - Medical Chatbot", page_icon="🩺", layout="centered")
 
-# Cache chatbot initialization
+# Load the chatbot in the background while the page renders; one service is
+# shared by every session
 @st.cache_resource
-def load_medical_qa():
-    return MedicalQA()
+def load_qa_service():
+    return start_service_warmup()
 
-medical_qa = load_medical_qa()
+warmup = load_qa_service()
+
+def get_qa_service():
+    """The QAService, waiting for the warm-up if it is still running."""
+    if warmup.error is not None:
+        load_qa_service.clear()  # retry on the next rerun
+    if not warmup.ready:
+        with st.spinner(f"Starting DocBot ({warmup.status()})"):
+            qa_service = warmup.result()
+        print_report(warmup.report())
+        return qa_service
+    return warmup.result()
 
 # Apply Custom CSS for chat-style UI with dark mode fixes
 st.markdown("""
@@ -102,6 +116,22 @@ st.markdown("""
     <p style='text-align: center; font-size: 18px;'>Ask me a medical question, and I'll provide a clear and helpful response.</p>
 """, unsafe_allow_html=True)
 
+# Background knowledge refresh status
+with st.sidebar:
+    if warmup.ready:
+        st.caption(f"🔄 Topics being looked up in the background: {warmup.result().refresh_queue_depth}")
+        st.caption(f"🚀 Started in {warmup.report()['warmup_ms'] / 1000:.1f}s")
+    else:
+        st.caption(f"🚀 DocBot is {warmup.status()}")
+    if st.session_state.get("last_ttft_ms") is not None:
+        st.caption(f"⏱️ Last answer's first token: {st.session_state.last_ttft_ms:.0f} ms")
+    if tracer.enabled:
+        with st.expander("📈 Latency by stage (ms)"):
+            st.table({
+                stage: {"p50": round(row["p50"]), "p95": round(row["p95"]), "p99": round(row["p99"]), "count": row["count"]}
+                for stage, row in tracer.percentiles().items()
+            })
+
 # Guide for prompts
 st.markdown("""
 ### 💡 **Try Asking DocBot:**
@@ -134,12 +164,25 @@ with input_container:
         submitted = st.form_submit_button("Get Answer")
 
     if submitted and user_query:
+        st.markdown(f"""<div class='user-message'><b>👤 You:</b> {user_query}</div>""", unsafe_allow_html=True)
+        answer_placeholder = st.empty()
+        qa_service = get_qa_service()
+
+        # Stream the answer into the placeholder as tokens arrive
         with st.spinner("Thinking..."):
-            response = medical_qa.answer_question(user_query)
+            start = time.perf_counter()
+            tokens = qa_service.stream_sync(user_query)
+            response = next(tokens, "")
+            st.session_state.last_ttft_ms = (time.perf_counter() - start) * 1000
+            tracer.observe("ui_first_token", st.session_state.last_ttft_ms / 1000)
+        answer_placeholder.markdown(f"""<div class='bot-message'><b>🤖 DocBot:</b> {response}▌</div>""", unsafe_allow_html=True)
+        for token in tokens:
+            response += token
+            answer_placeholder.markdown(f"""<div class='bot-message'><b>🤖 DocBot:</b> {response}▌</div>""", unsafe_allow_html=True)
 
         # Store user query and response in session state
         st.session_state.messages.append({"role": "user", "content": user_query})
-        st.session_state.messages.append({"role": "bot", "content": response})
+        st.session_state.messages.append({"role": "bot", "content": response.strip()})
 
         # Refresh chat by reloading page elements
         st.rerun()
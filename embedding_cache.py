@@ -0,0 +1,273 @@
+"""
+This module contains a persistent embedding cache shared by index builds and
+the chatbot, so text that has been embedded once never goes through the model
+again.
+
+Vectors live in a memory-mapped float32 matrix (`vectors.f32`); a small SQLite
+database maps the hash of each text to its row and tracks when it was last
+used, which is what the size cap evicts by.
+"""
+
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_CACHE_PATH = "vectorstore/embedding_cache"
+# A local copy of the model written by save_embedding_snapshot; loading it skips
+# the Hugging Face hub lookups done on every start otherwise.
+EMBEDDING_SNAPSHOT_PATH = os.getenv("DOCBOT_EMBEDDING_SNAPSHOT", "vectorstore/embedding_model")
+
+
+class EmbeddingCache:
+    """
+    Disk-backed map from text hash to embedding vector.
+
+    Row allocation, and reads of the rows found, happen inside IMMEDIATE
+    SQLite transactions, so the ingestion script and a running app can share
+    one cache directory. Once `max_rows` vectors are stored, the least
+    recently used rows are reused.
+    """
+
+    GROWTH_ROWS = 1024
+    SQL_BATCH = 500
+
+    def __init__(self, cache_dir: str = EMBEDDING_CACHE_PATH, max_rows: int = 100_000):
+        self.cache_dir = cache_dir
+        self.max_rows = max_rows
+        os.makedirs(cache_dir, exist_ok=True)
+        self.vectors_path = os.path.join(cache_dir, "vectors.f32")
+        self._conn = sqlite3.connect(
+            os.path.join(cache_dir, "index.sqlite"), timeout=30, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries (hash TEXT PRIMARY KEY, row INTEGER NOT NULL UNIQUE, last_used REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+        self._lock = threading.Lock()
+        self._matrix: Optional[np.memmap] = None
+        self.dim: Optional[int] = self._get_meta("dim", int)
+
+    def _get_meta(self, key: str, cast=str):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return cast(row[0]) if row else None
+
+    def _set_meta(self, key: str, value):
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def _mapped_rows(self) -> int:
+        return 0 if self._matrix is None else self._matrix.shape[0]
+
+    def _map(self, min_rows: int = 0):
+        """(Re)map the vector file, growing it to at least `min_rows` rows."""
+        row_bytes = self.dim * 4
+        file_rows = os.path.getsize(self.vectors_path) // row_bytes if os.path.exists(self.vectors_path) else 0
+        if min_rows > file_rows:
+            new_rows = min(self.max_rows, max(min_rows, file_rows * 2, self.GROWTH_ROWS))
+            with open(self.vectors_path, "ab") as f:
+                f.truncate(new_rows * row_bytes)
+            file_rows = new_rows
+        if file_rows and file_rows != self._mapped_rows():
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(file_rows, self.dim))
+
+    def _lookup_rows(self, keys: Sequence[str]) -> Dict[str, int]:
+        rows = {}
+        for start in range(0, len(keys), self.SQL_BATCH):
+            batch = keys[start:start + self.SQL_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            rows.update(self._conn.execute(
+                f"SELECT hash, row FROM entries WHERE hash IN ({placeholders})", batch
+            ).fetchall())
+        return rows
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Return the cached vectors for whichever of `keys` are present."""
+        if self.dim is None or not keys:
+            return {}
+        with self._lock:
+            # Same write transaction as put_many, so another process can't evict
+            # and refill a row between finding it and reading its vector
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._lookup_rows(list(keys))
+                if not rows:
+                    self._conn.execute("COMMIT")
+                    return {}
+                if max(rows.values()) >= self._mapped_rows():
+                    self._map()
+                vectors = {key: np.array(self._matrix[row]) for key, row in rows.items()}
+                now = time.time()
+                for start in range(0, len(rows), self.SQL_BATCH):
+                    batch = list(rows)[start:start + self.SQL_BATCH]
+                    placeholders = ",".join("?" * len(batch))
+                    self._conn.execute(f"UPDATE entries SET last_used = ? WHERE hash IN ({placeholders})", [now, *batch])
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            return vectors
+
+    def put_many(self, items: Sequence[Tuple[str, Sequence[float]]]):
+        """Store vectors, evicting the least recently used rows when full."""
+        if not items:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if self.dim is None:
+                    self.dim = self._get_meta("dim", int) or len(items[0][1])
+                    self._set_meta("dim", self.dim)
+
+                existing = self._lookup_rows([key for key, _ in items])
+                pending = {}
+                for key, vector in items:
+                    if key not in existing:
+                        pending[key] = vector
+                pending = dict(list(pending.items())[:self.max_rows])
+                if not pending:
+                    self._conn.execute("COMMIT")
+                    return
+
+                next_row = self._get_meta("next_row", int) or 0
+                fresh = min(len(pending), self.max_rows - next_row)
+                rows = list(range(next_row, next_row + fresh))
+                self._set_meta("next_row", next_row + fresh)
+
+                evict_count = len(pending) - fresh
+                if evict_count:
+                    evicted = self._conn.execute(
+                        "SELECT hash, row FROM entries ORDER BY last_used LIMIT ?", (evict_count,)
+                    ).fetchall()
+                    self._conn.executemany("DELETE FROM entries WHERE hash = ?", [(key,) for key, _ in evicted])
+                    rows.extend(row for _, row in evicted)
+
+                self._map(min_rows=max(rows) + 1)
+                matrix = np.asarray(list(pending.values()), dtype=np.float32)
+                self._matrix[rows] = matrix
+                self._matrix.flush()
+
+                now = time.time()
+                self._conn.executemany(
+                    "INSERT INTO entries (hash, row, last_used) VALUES (?, ?, ?)",
+                    [(key, row, now) for key, row in zip(pending, rows)]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that consults an EmbeddingCache before the model.
+
+    The model is only built on the first cache miss, so a run where every text
+    is cached never loads it. Queries and documents share keys: the wrapped
+    sentence-transformers model encodes both the same way.
+    """
+
+    def __init__(self, model_factory: Callable[[], Embeddings], cache: EmbeddingCache, model_name: str):
+        self.model_factory = model_factory
+        self.cache = cache
+        self.model_name = model_name
+        self._model: Optional[Embeddings] = None
+        self._model_lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    @property
+    def model(self) -> Embeddings:
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = self.model_factory()
+        return self._model
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def lookup(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Cached vector for each text, or None where the text is not cached."""
+        keys = [self._key(text) for text in texts]
+        cached = self.cache.get_many(list(dict.fromkeys(keys)))
+        return [cached.get(key) for key in keys]
+
+    def store(self, texts: Sequence[str], vectors: Sequence[Sequence[float]]):
+        """Add vectors computed outside this wrapper (e.g. by worker processes)."""
+        self.cache.put_many([(self._key(text), vector) for text, vector in zip(texts, vectors)])
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.lookup(texts)
+
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+        self.stats["hits"] += len(texts) - sum(vector is None for vector in vectors)
+        self.stats["misses"] += len(missing)
+
+        if missing:
+            computed = dict(zip(missing, self.model.embed_documents(missing)))
+            self.store(list(computed), list(computed.values()))
+            vectors = [computed[text] if vector is None else vector for text, vector in zip(texts, vectors)]
+
+        return [vector.tolist() if isinstance(vector, np.ndarray) else list(vector) for vector in vectors]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        cached = self.cache.get_many([key])
+        if key in cached:
+            self.stats["hits"] += 1
+            return cached[key].tolist()
+
+        self.stats["misses"] += 1
+        vector = self.model.embed_query(text)
+        self.cache.put_many([(key, vector)])
+        return vector
+
+
+_shared_embeddings: Optional[CachedEmbeddings] = None
+_shared_lock = threading.Lock()
+
+def get_embedding_model(model_name: str = EMBEDDING_MODEL_NAME, cache_dir: str = EMBEDDING_CACHE_PATH) -> CachedEmbeddings:
+    """
+    Return the process-wide cached MiniLM embedding model.
+    Both the index build and the chatbot go through this.
+    """
+    global _shared_embeddings
+    with _shared_lock:
+        if _shared_embeddings is None:
+            def load_model():
+                from langchain_community.embeddings import HuggingFaceEmbeddings
+                if model_name == EMBEDDING_MODEL_NAME and os.path.isdir(EMBEDDING_SNAPSHOT_PATH):
+                    print(f"🧠 Loading embedding model snapshot from {EMBEDDING_SNAPSHOT_PATH}...")
+                    return HuggingFaceEmbeddings(model_name=EMBEDDING_SNAPSHOT_PATH)
+                print("🧠 Loading embedding model...")
+                return HuggingFaceEmbeddings(model_name=model_name)
+
+            _shared_embeddings = CachedEmbeddings(load_model, EmbeddingCache(cache_dir), model_name)
+        return _shared_embeddings
+
+
+def save_embedding_snapshot(path: str = EMBEDDING_SNAPSHOT_PATH, model_name: str = EMBEDDING_MODEL_NAME):
+    """
+    Save the sentence-transformers model to `path`, which get_embedding_model
+    then loads from instead of the hub. Vectors stay keyed by `model_name`,
+    so the embedding cache remains valid.
+    """
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+    model = HuggingFaceEmbeddings(model_name=model_name)
+    tmp_path = f"{path}.tmp"
+    model.client.save(tmp_path)
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    os.replace(tmp_path, path)
+    print(f"💾 Saved embedding model snapshot to {path}")
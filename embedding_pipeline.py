@@ -0,0 +1,199 @@
+"""
+This module contains the streaming embedding stage used by index builds.
+Chunks are embedded in bounded batches, optionally on a pool of worker
+processes, and added to the FAISS index as each batch completes.
+"""
+
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
+from multiprocessing import get_context
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from langchain_core.documents import Document
+from langchain_community.vectorstores import FAISS
+
+from embedding_cache import CachedEmbeddings, EMBEDDING_MODEL_NAME
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_worker_model = None
+
+
+def _init_worker(model_name: str, threads: int):
+    """Load one embedding model per worker process."""
+    global _worker_model
+    import torch
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+
+    torch.set_num_threads(threads)
+    _worker_model = HuggingFaceEmbeddings(model_name=model_name)
+
+
+def _embed_in_worker(texts: List[str]) -> Tuple[List[List[float]], int, Optional[float]]:
+    """Vectors, plus this worker's pid and peak memory so the parent can total them."""
+    return _worker_model.embed_documents(texts), os.getpid(), peak_memory_mb()
+
+
+def iter_batches(items: Iterable, batch_size: int) -> Iterator[List]:
+    """Yield lists of up to `batch_size` items without materialising `items`."""
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def peak_memory_mb() -> Optional[float]:
+    """Peak resident memory of this process, in MB."""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # ru_maxrss is in KB on Linux
+
+
+class EmbeddingPipeline:
+    """
+    Embeds (id, chunk) pairs in batches of `batch_size` and streams them into
+    a FAISS index. `embed_batches` runs the same stages over batches of plain
+    texts, for callers that want the vectors themselves.
+
+    With `workers` > 1 the model runs in that many processes, each pinned to
+    cpu_count / workers torch threads, and at most 2 * workers batches are in
+    flight. Otherwise batches are embedded in this process. Texts already in
+    the embedding cache never leave this process.
+    """
+
+    def __init__(self, embed_model, batch_size: int = 256, workers: int = 1):
+        self.embed_model = embed_model
+        self.batch_size = batch_size
+        self.workers = workers
+        self.stats: Dict[str, float] = {}
+
+    def _model_name(self) -> str:
+        return getattr(self.embed_model, "model_name", EMBEDDING_MODEL_NAME)
+
+    def _cached_vectors(self, texts: List[str]) -> List:
+        if isinstance(self.embed_model, CachedEmbeddings):
+            return self.embed_model.lookup(texts)
+        return [None] * len(texts)
+
+    def _add_batch(self, batch: List[Tuple[str, Document]], vectors: List, db):
+        text_embeddings = [(chunk.page_content, list(vector)) for (_, chunk), vector in zip(batch, vectors)]
+        metadatas = [chunk.metadata for _, chunk in batch]
+        ids = [doc_id for doc_id, _ in batch]
+        if db is None:
+            return FAISS.from_embeddings(text_embeddings, self.embed_model, metadatas=metadatas, ids=ids)
+        db.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+        return db
+
+    def run(self, items: Iterable[Tuple[str, Document]], db: Optional[FAISS] = None,
+            total: Optional[int] = None) -> Optional[FAISS]:
+        """
+        Embed every (id, chunk) in `items` into `db`, creating it if needed.
+        Throughput and peak memory are printed and kept in `self.stats`.
+        """
+        pending = deque()
+
+        def text_batches() -> Iterator[List[str]]:
+            for batch in iter_batches(items, self.batch_size):
+                pending.append(batch)
+                yield [chunk.page_content for _, chunk in batch]
+
+        for vectors in self.embed_batches(text_batches(), total=total):
+            db = self._add_batch(pending.popleft(), vectors, db)
+        return db
+
+    def embed_batches(self, batches: Iterable[List[str]], total: Optional[int] = None,
+                      unit: str = "chunks") -> Iterator[List]:
+        """
+        Vectors for each batch of texts, in order, as soon as that batch is done.
+        `total` (texts) and `unit` are only used in the progress output.
+        """
+        start = time.perf_counter()
+        done = 0
+        embedded = 0
+        executor = None
+        if self.workers > 1:
+            threads = max(1, (os.cpu_count() or 1) // self.workers)
+            executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self._model_name(), threads),
+            )
+
+        in_flight = deque()
+        max_in_flight = 2 * self.workers
+        worker_peaks: Dict[int, float] = {}
+
+        def drain(limit: int) -> Iterator[List]:
+            nonlocal done, embedded
+            while len(in_flight) > limit:
+                texts, vectors, missing, future = in_flight.popleft()
+                if future is not None:
+                    computed = future.result()
+                    if executor is not None:
+                        computed, pid, worker_peak = computed
+                        if worker_peak is not None:
+                            worker_peaks[pid] = max(worker_peak, worker_peaks.get(pid, 0.0))
+                    computed = list(computed)
+                    if isinstance(self.embed_model, CachedEmbeddings):
+                        self.embed_model.store(missing, computed)
+                    by_text = dict(zip(missing, computed))
+                    vectors = [by_text[text] if vector is None else vector for text, vector in zip(texts, vectors)]
+                done += len(texts)
+                embedded += len(missing)
+                elapsed = time.perf_counter() - start
+                progress = f"{done}/{total}" if total else str(done)
+                print(f"🧠 Embedded {progress} {unit} ({done / elapsed:.1f} {unit}/s)")
+                yield vectors
+
+        try:
+            for texts in batches:
+                vectors = self._cached_vectors(texts)
+                missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+
+                if not missing:
+                    future = None
+                elif executor is not None:
+                    future = executor.submit(_embed_in_worker, missing)
+                else:
+                    model = self.embed_model.model if isinstance(self.embed_model, CachedEmbeddings) else self.embed_model
+                    future = Future()
+                    future.set_result(model.embed_documents(missing))
+
+                in_flight.append((texts, vectors, missing, future))
+                yield from drain(max_in_flight if executor is not None else 0)
+            yield from drain(0)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        elapsed = time.perf_counter() - start
+        self.stats = {
+            unit: done,
+            "embedded": embedded,
+            "cached": done - embedded,
+            "seconds": elapsed,
+            f"{unit}_per_second": done / elapsed if elapsed else 0.0,
+            "peak_memory_mb": peak_memory_mb(),
+            # Sum of each worker's own peak: an upper bound, as the peaks needn't coincide
+            "workers_peak_memory_mb": sum(worker_peaks.values()) if worker_peaks else None,
+        }
+        peak = self.stats["peak_memory_mb"]
+        workers_peak = self.stats["workers_peak_memory_mb"]
+        memory = ""
+        if peak is not None:
+            memory = f", peak memory {peak:.0f} MB"
+            if workers_peak is not None:
+                memory += f" + {workers_peak:.0f} MB across {len(worker_peaks)} workers"
+        print(
+            f"⏱️ Embedded {done} {unit} in {elapsed:.1f}s ({self.stats[f'{unit}_per_second']:.1f} {unit}/s, "
+            f"{embedded} computed, {done - embedded} from cache{memory})"
+        )
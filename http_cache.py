@@ -0,0 +1,146 @@
+"""
+This module contains the ResponseCache class, a persistent cache of MedlinePlus
+search results keyed by request URL.
+
+Entries hold the parsed articles (zlib-compressed JSON) together with the
+response's ETag/Last-Modified and a hash of its body. DataFetcher uses them as:
+  - fresh (younger than `ttl`): served without contacting NLM
+  - stale: revalidated with If-None-Match/If-Modified-Since; a 304, or a 200
+    with an unchanged body, reuses the stored articles without re-parsing
+Queries that returned no documents are kept for the shorter `negative_ttl`.
+Once the stored entries exceed `max_bytes`, the least recently used go first.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, List, NamedTuple, Optional
+
+HTTP_CACHE_PATH = "vectorstore/http_cache.sqlite"
+
+
+class CachedResponse(NamedTuple):
+    articles: List[Dict]
+    etag: Optional[str]
+    last_modified: Optional[str]
+    body_hash: Optional[str]
+    fresh: bool
+
+    def validators(self) -> Dict[str, str]:
+        """Headers for a conditional GET."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    def __init__(self, path: str = HTTP_CACHE_PATH, max_bytes: int = 64 * 1024 * 1024,
+                 ttl: float = 24 * 3600, negative_ttl: float = 6 * 3600):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "url TEXT PRIMARY KEY, articles BLOB NOT NULL, size INTEGER NOT NULL, empty INTEGER NOT NULL, "
+            "etag TEXT, last_modified TEXT, body_hash TEXT, validated_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self._lock = threading.Lock()
+        self.stats = {"fresh_hits": 0, "negative_hits": 0, "revalidated": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def size_bytes(self) -> int:
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, url: str) -> Optional[CachedResponse]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT articles, empty, etag, last_modified, body_hash, validated_at FROM responses WHERE url = ?",
+                (url,)
+            ).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            blob, empty, etag, last_modified, body_hash, validated_at = row
+            fresh = time.time() - validated_at < (self.negative_ttl if empty else self.ttl)
+            if fresh:
+                self.stats["negative_hits" if empty else "fresh_hits"] += 1
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE url = ?", (time.time(), url))
+        return CachedResponse(json.loads(zlib.decompress(blob)), etag, last_modified, body_hash, fresh)
+
+    def revalidated(self, url: str):
+        """The server confirmed the stored entry (e.g. a 304); it is fresh again."""
+        with self._lock:
+            self.stats["revalidated"] += 1
+            now = time.time()
+            self._conn.execute("UPDATE responses SET validated_at = ?, last_used = ? WHERE url = ?", (now, now, url))
+
+    def put(self, url: str, articles: List[Dict], etag: Optional[str] = None,
+            last_modified: Optional[str] = None, body_hash: Optional[str] = None):
+        blob = zlib.compress(json.dumps(articles, ensure_ascii=False).encode("utf-8"))
+        if len(blob) > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses "
+                    "(url, articles, size, empty, etag, last_modified, body_hash, validated_at, last_used) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (url, blob, len(blob), int(not articles), etag, last_modified, body_hash, now, now)
+                )
+                self.stats["stores"] += 1
+                self._evict()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes."""
+        excess = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0] - self.max_bytes
+        if excess <= 0:
+            return
+        evicted = []
+        for url, size in self._conn.execute("SELECT url, size FROM responses ORDER BY last_used"):
+            evicted.append((url,))
+            excess -= size
+            if excess <= 0:
+                break
+        self._conn.executemany("DELETE FROM responses WHERE url = ?", evicted)
+        self.stats["evictions"] += len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+
+
+_shared_cache: Optional[ResponseCache] = None
+_shared_lock = threading.Lock()
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """
+    The process-wide MedlinePlus response cache, or None if DOCBOT_HTTP_CACHE=0.
+    DOCBOT_HTTP_CACHE_TTL sets the freshness lifetime in seconds.
+    """
+    global _shared_cache
+    if os.getenv("DOCBOT_HTTP_CACHE", "1") in ("", "0", "false"):
+        return None
+    with _shared_lock:
+        if _shared_cache is None:
+            ttl = float(os.getenv("DOCBOT_HTTP_CACHE_TTL", 24 * 3600))
+            _shared_cache = ResponseCache(ttl=ttl, negative_ttl=min(ttl, 6 * 3600))
+        return _shared_cache
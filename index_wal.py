@@ -0,0 +1,121 @@
+"""
+This module contains the IndexWAL class, an append-only log of chunks added to
+the index at runtime.
+
+Each record holds the chunks' ids, texts, metadata and embedding vectors, so a
+restart can rebuild the in-memory index from the last snapshot plus the log
+without re-embedding anything. Records are framed as
+
+    <json length><vector bytes length><crc32>  json header  float32 vectors
+
+and fsynced on append. A torn or corrupt record at the end (a crash mid-append)
+is dropped on read, together with anything after it.
+
+Replicas serving the same index share the log. Appends, reads and resets take
+an exclusive lock on updates.wal.lock, so compaction can fold the log into a
+snapshot without losing a record another process appends meanwhile.
+"""
+
+import json
+import os
+import struct
+import threading
+import zlib
+from contextlib import contextmanager
+from typing import Dict, List, NamedTuple, Sequence
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads of this process are serialized
+    fcntl = None
+
+WAL_NAME = "updates.wal"
+_FRAME = struct.Struct("<III")
+
+
+class WALRecord(NamedTuple):
+    ids: List[str]
+    texts: List[str]
+    metadatas: List[Dict]
+    vectors: np.ndarray
+
+
+class IndexWAL:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._lock_file = None
+        self._records = len(self.records())
+
+    def __len__(self) -> int:
+        """Number of records appended since the last snapshot."""
+        return self._records
+
+    @contextmanager
+    def exclusive(self):
+        """Hold the log against every other thread and process using it; re-entrant."""
+        with self._lock:
+            if self._lock_file is not None or fcntl is None:
+                yield
+                return
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(f"{self.path}.lock", "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)  # released when the file is closed
+                self._lock_file = lock_file
+                try:
+                    yield
+                finally:
+                    self._lock_file = None
+
+    def append(self, ids: Sequence[str], texts: Sequence[str], metadatas: Sequence[Dict], vectors):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        header = json.dumps(
+            {"ids": list(ids), "texts": list(texts), "metadatas": list(metadatas), "dim": vectors.shape[1]},
+            ensure_ascii=False,
+        ).encode("utf-8")
+        body = vectors.tobytes()
+        frame = _FRAME.pack(len(header), len(body), zlib.crc32(header + body))
+
+        with self.exclusive():
+            with open(self.path, "ab") as f:
+                f.write(frame + header + body)
+                f.flush()
+                os.fsync(f.fileno())
+            self._records += 1
+
+    def records(self) -> List[WALRecord]:
+        """Every intact record, oldest first. A damaged tail is truncated away."""
+        with self.exclusive():
+            if not os.path.exists(self.path):
+                return []
+            with open(self.path, "rb") as f:
+                data = f.read()
+
+            records, offset = [], 0
+            while offset + _FRAME.size <= len(data):
+                header_len, body_len, crc = _FRAME.unpack_from(data, offset)
+                start = offset + _FRAME.size
+                end = start + header_len + body_len
+                if end > len(data) or zlib.crc32(data[start:end]) != crc:
+                    break
+                header = json.loads(data[start:start + header_len])
+                vectors = np.frombuffer(data[start + header_len:end], dtype=np.float32).reshape(-1, header["dim"])
+                records.append(WALRecord(header["ids"], header["texts"], header["metadatas"], vectors))
+                offset = end
+
+            if offset < len(data):
+                print(f"⚠️ Dropping {len(data) - offset} bytes of incomplete log records from {self.path}")
+                with open(self.path, "r+b") as f:
+                    f.truncate(offset)
+        return records
+
+    def reset(self):
+        """Empty the log once its records are part of a snapshot."""
+        with self.exclusive():
+            if os.path.exists(self.path):
+                with open(self.path, "r+b") as f:
+                    f.truncate(0)
+                    os.fsync(f.fileno())
+            self._records = 0
@@ -0,0 +1,88 @@
+"""
+This module contains the KnowledgeRefresher class, a background worker that
+fetches new topics off the request path so users never wait on MedlinePlus.
+"""
+
+import queue
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+
+class KnowledgeRefresher:
+    """
+    Single background thread draining a queue of topics to refresh.
+
+    Topics are merged case-insensitively: a topic that is already queued or
+    being fetched is not queued again, and a topic refreshed within the last
+    `cooldown` seconds is skipped so repeated misses don't refetch it.
+    """
+
+    def __init__(self, refresh_fn: Callable[[str], bool], cooldown: float = 600.0):
+        self.refresh_fn = refresh_fn
+        self.cooldown = cooldown
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        self._pending: Dict[str, str] = {}
+        self._last_refreshed: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        self.stats = {"queued": 0, "merged": 0, "refreshed": 0, "failed": 0}
+
+    @staticmethod
+    def _key(topic: str) -> str:
+        return topic.strip().casefold()
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of topics queued or currently being fetched."""
+        with self._lock:
+            return len(self._pending)
+
+    def pending_topics(self):
+        with self._lock:
+            return list(self._pending.values())
+
+    def is_pending(self, topic: str) -> bool:
+        with self._lock:
+            return self._key(topic) in self._pending
+
+    def enqueue(self, topic: str) -> bool:
+        """
+        Queue a topic for background refresh.
+        Returns False if it was merged with a pending or recent refresh.
+        """
+        key = self._key(topic)
+        with self._lock:
+            recently = time.monotonic() - self._last_refreshed.get(key, float("-inf")) < self.cooldown
+            if key in self._pending or recently:
+                self.stats["merged"] += 1
+                return False
+            self._pending[key] = topic
+            self.stats["queued"] += 1
+            self._ensure_worker()
+        self._queue.put(topic)
+        return True
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name="knowledge-refresher", daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            topic = self._queue.get()
+            key = self._key(topic)
+            try:
+                ok = self.refresh_fn(topic)
+            except Exception as e:
+                print(f"❌ Background refresh failed for {topic}: {e}")
+                ok = False
+            with self._lock:
+                self._pending.pop(key, None)
+                self._last_refreshed[key] = time.monotonic()
+                self.stats["refreshed" if ok else "failed"] += 1
+            self._queue.task_done()
+
+    def join(self):
+        """Block until every queued topic has been processed."""
+        self._queue.join()
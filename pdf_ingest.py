@@ -0,0 +1,224 @@
+"""
+This module contains the PdfIngestor, which finds the PDFs in the data
+directory that were added, changed or removed since the last index build and
+loads only those.
+
+  vectorstore/pdf_cache.sqlite
+    files  each indexed PDF's name, size, mtime and SHA-256, as of the last
+           successful build
+    pages  extracted page text and metadata by file SHA-256, so a touched or
+           renamed file is not parsed again
+
+A file whose size and mtime are unchanged is not read at all; otherwise it is
+hashed, and only a new hash means it changed. PDFs are parsed with PyPDFLoader
+in a process pool, one file per task.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from langchain_core.documents import Document
+
+PDF_CACHE_PATH = "vectorstore/pdf_cache.sqlite"
+
+
+class PdfFile(NamedTuple):
+    name: str
+    path: str
+    size: int
+    mtime_ns: int
+    sha256: Optional[str] = None
+
+    @property
+    def source(self) -> str:
+        """The index's chunk source key, see LLM_Memory_Creation.chunk_source."""
+        return f"pdf:{self.name}"
+
+
+class PdfChanges(NamedTuple):
+    added: List[PdfFile]
+    changed: List[PdfFile]
+    removed: List[str]
+    unchanged: List[PdfFile]
+
+    @property
+    def to_load(self) -> List[PdfFile]:
+        return self.added + self.changed
+
+    @property
+    def removed_sources(self) -> List[str]:
+        return [f"pdf:{name}" for name in self.removed]
+
+    def summary(self) -> str:
+        return (f"{len(self.added)} added, {len(self.changed)} changed, "
+                f"{len(self.removed)} removed, {len(self.unchanged)} unchanged")
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _extract_pages(path: str) -> List[Tuple[str, Dict]]:
+    """(text, metadata) per page. Runs in a worker process."""
+    from langchain_community.document_loaders import PyPDFLoader
+    pages = []
+    for doc in PyPDFLoader(path).load():
+        metadata = {key: value for key, value in doc.metadata.items() if key != "source"}
+        pages.append((doc.page_content, metadata))
+    return pages
+
+
+class PdfIngestor:
+    def __init__(self, data_path: str, cache_path: str = PDF_CACHE_PATH, workers: int = 1):
+        self.data_path = data_path
+        self.workers = max(1, workers)
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(cache_path, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "name TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, sha256 TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "sha256 TEXT NOT NULL, page INTEGER NOT NULL, text TEXT NOT NULL, metadata TEXT NOT NULL, "
+            "PRIMARY KEY (sha256, page))"
+        )
+        self._failed = set()
+        self.stats = {"parsed_files": 0, "cached_files": 0, "failed_files": 0, "pages": 0}
+
+    def _on_disk(self) -> Dict[str, PdfFile]:
+        if not os.path.isdir(self.data_path):
+            return {}
+        files = {}
+        for entry in os.scandir(self.data_path):
+            if entry.is_file() and entry.name.lower().endswith(".pdf"):
+                stat = entry.stat()
+                files[entry.name] = PdfFile(entry.name, entry.path, stat.st_size, stat.st_mtime_ns)
+        return files
+
+    def scan(self, indexed_sources: Optional[Iterable[str]] = None) -> PdfChanges:
+        """
+        Compare the data directory with the last build. `indexed_sources` are the
+        chunk sources in the index (None: no index yet, everything is added);
+        a PDF the index doesn't have is loaded whatever the cache says.
+        """
+        indexed = set(indexed_sources or ())
+        known = {
+            name: (size, mtime_ns, sha256)
+            for name, size, mtime_ns, sha256 in self._conn.execute("SELECT name, size, mtime_ns, sha256 FROM files")
+        }
+        on_disk = self._on_disk()
+        added, changed, unchanged = [], [], []
+        for name in sorted(on_disk):
+            pdf = on_disk[name]
+            if pdf.source not in indexed:
+                added.append(pdf._replace(sha256=file_sha256(pdf.path)))
+                continue
+            record = known.get(name)
+            if record is not None and record[:2] == (pdf.size, pdf.mtime_ns):
+                unchanged.append(pdf._replace(sha256=record[2]))
+                continue
+            pdf = pdf._replace(sha256=file_sha256(pdf.path))
+            # Indexed before this cache existed, or edited since
+            (unchanged if record is not None and record[2] == pdf.sha256 else changed).append(pdf)
+
+        removed = {name for name in known if name not in on_disk}
+        removed |= {source[4:] for source in indexed if source.startswith("pdf:") and source[4:] not in on_disk}
+        return PdfChanges(added, changed, sorted(removed), unchanged)
+
+    def _cached_pages(self, sha256: str) -> Optional[List[Tuple[str, Dict]]]:
+        rows = self._conn.execute(
+            "SELECT text, metadata FROM pages WHERE sha256 = ? ORDER BY page", (sha256,)
+        ).fetchall()
+        return [(text, json.loads(metadata)) for text, metadata in rows] or None
+
+    def _store_pages(self, sha256: str, pages: List[Tuple[str, Dict]]):
+        self._conn.execute("BEGIN IMMEDIATE")
+        self._conn.execute("DELETE FROM pages WHERE sha256 = ?", (sha256,))
+        self._conn.executemany(
+            "INSERT INTO pages (sha256, page, text, metadata) VALUES (?, ?, ?, ?)",
+            [(sha256, number, text, json.dumps(metadata, default=str)) for number, (text, metadata) in enumerate(pages)]
+        )
+        self._conn.execute("COMMIT")
+
+    def load(self, files: List[PdfFile]) -> List[Document]:
+        """Pages of `files` as Documents, parsing those not in the page cache in parallel."""
+        pages: Dict[str, List[Tuple[str, Dict]]] = {}
+        to_parse = []
+        for pdf in files:
+            cached = self._cached_pages(pdf.sha256)
+            if cached is not None:
+                pages[pdf.name] = cached
+                self.stats["cached_files"] += 1
+            else:
+                to_parse.append(pdf)
+
+        if to_parse:
+            print(f"📄 Parsing {len(to_parse)} PDFs with {min(self.workers, len(to_parse))} workers...")
+        for pdf, result in zip(to_parse, self._parse(to_parse)):
+            if isinstance(result, Exception):
+                print(f"⚠️ Could not read {pdf.name}: {result}")
+                self._failed.add(pdf.name)
+                self.stats["failed_files"] += 1
+                continue
+            self._store_pages(pdf.sha256, result)
+            pages[pdf.name] = result
+            self.stats["parsed_files"] += 1
+
+        documents = []
+        for pdf in files:
+            for text, metadata in pages.get(pdf.name, []):
+                documents.append(Document(
+                    page_content=text,
+                    metadata={**metadata, "source_type": "pdf", "source": pdf.name}
+                ))
+        self.stats["pages"] += len(documents)
+        return documents
+
+    def _parse(self, files: List[PdfFile]) -> List:
+        """Pages of each file, or the exception that reading it raised."""
+        if self.workers == 1 or len(files) <= 1:
+            results = []
+            for pdf in files:
+                try:
+                    results.append(_extract_pages(pdf.path))
+                except Exception as e:
+                    results.append(e)
+            return results
+
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(files))) as executor:
+            futures = [executor.submit(_extract_pages, pdf.path) for pdf in files]
+            results = []
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    results.append(e)
+            return results
+
+    def commit(self, changes: PdfChanges):
+        """
+        Record the scanned state as indexed; call after the index was saved.
+        Files that failed to load are left out, so the next build retries them.
+        """
+        rows = [
+            (pdf.name, pdf.size, pdf.mtime_ns, pdf.sha256)
+            for pdf in changes.to_load + changes.unchanged if pdf.name not in self._failed
+        ]
+        self._conn.execute("BEGIN IMMEDIATE")
+        self._conn.executemany("DELETE FROM files WHERE name = ?", [(name,) for name in changes.removed])
+        self._conn.executemany("INSERT OR REPLACE INTO files (name, size, mtime_ns, sha256) VALUES (?, ?, ?, ?)", rows)
+        self._conn.execute("DELETE FROM pages WHERE sha256 NOT IN (SELECT sha256 FROM files)")
+        self._conn.execute("COMMIT")
+
+    def close(self):
+        self._conn.close()
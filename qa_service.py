@@ -0,0 +1,187 @@
+"""
+This module contains the QAService class, an asyncio front end that lets many
+users share one MedicalQA instance.
+
+Answers are generated on a thread pool, so retrieval and LLM calls for
+different questions overlap. Identical questions asked while one is still
+being answered share that answer's token stream instead of generating it
+again. Topic refreshes are already coalesced by MedicalQA's KnowledgeRefresher,
+and index swaps are guarded by MedicalQA.index_lock.
+
+Usage:
+    python qa_service.py                      # interactive, streamed answers
+    python qa_service.py "question" ...       # answer questions concurrently
+"""
+
+import asyncio
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+
+from LLM_Connect_Memory import MedicalQA
+from startup import Warmup, print_report, start_service_warmup
+from topic_resolver import normalize
+
+
+def question_key(question: str) -> str:
+    """Questions differing only in case, punctuation or spacing are the same request."""
+    return normalize(question)
+
+
+class _TokenBroadcast:
+    """Tokens of one answer, replayed to every subscriber from the start."""
+
+    def __init__(self):
+        self.tokens: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def push(self, token: str):
+        self.tokens.append(token)
+        self._notify()
+
+    def finish(self, error: Optional[BaseException] = None):
+        self.done = True
+        self.error = error
+        self._notify()
+
+    async def follow(self) -> AsyncIterator[str]:
+        position = 0
+        while True:
+            changed = self._changed
+            while position < len(self.tokens):
+                yield self.tokens[position]
+                position += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await changed.wait()
+
+
+class QAService:
+    """
+    Async wrapper around MedicalQA. Use `answer`/`stream` from one event loop,
+    or `answer_sync`/`stream_sync` from any thread (e.g. Streamlit sessions),
+    which run on the service's own background loop.
+    """
+
+    def __init__(self, medical_qa: Optional[MedicalQA] = None, max_concurrency: int = 8):
+        self.qa = medical_qa or MedicalQA()
+        self._executor = ThreadPoolExecutor(max_concurrency, thread_name_prefix="qa-worker")
+        self._in_flight: Dict[str, _TokenBroadcast] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_lock = threading.Lock()
+        self.stats = {"answered": 0, "coalesced": 0}
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+    @property
+    def refresh_queue_depth(self) -> int:
+        return self.qa.refresh_queue_depth
+
+    def _finish(self, key: str, broadcast: _TokenBroadcast, error: Optional[BaseException] = None):
+        self._in_flight.pop(key, None)
+        broadcast.finish(error)
+
+    def _produce(self, key: str, question: str, broadcast: _TokenBroadcast, loop: asyncio.AbstractEventLoop):
+        """Runs on a worker thread, handing tokens back to the event loop."""
+        try:
+            for token in self.qa.stream_answer(question):
+                loop.call_soon_threadsafe(broadcast.push, token)
+        except Exception as e:
+            loop.call_soon_threadsafe(self._finish, key, broadcast, e)
+        else:
+            loop.call_soon_threadsafe(self._finish, key, broadcast)
+
+    async def stream(self, question: str) -> AsyncIterator[str]:
+        key = question_key(question)
+        broadcast = self._in_flight.get(key)
+        if broadcast is None:
+            broadcast = _TokenBroadcast()
+            self._in_flight[key] = broadcast
+            loop = asyncio.get_running_loop()
+            loop.run_in_executor(self._executor, self._produce, key, question, broadcast, loop)
+            self.stats["answered"] += 1
+        else:
+            self.stats["coalesced"] += 1
+        async for token in broadcast.follow():
+            yield token
+
+    async def answer(self, question: str) -> str:
+        return "".join([token async for token in self.stream(question)]).strip()
+
+    def _background_loop(self) -> asyncio.AbstractEventLoop:
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="qa-service-loop", daemon=True).start()
+            return self._loop
+
+    def stream_sync(self, question: str) -> Iterator[str]:
+        """Blocking iterator over `stream(question)`, safe to call from any thread."""
+        tokens: "queue.Queue" = queue.Queue()
+        done = object()
+
+        async def pump():
+            try:
+                async for token in self.stream(question):
+                    tokens.put(token)
+            except Exception as e:
+                tokens.put(e)
+            finally:
+                tokens.put(done)
+
+        asyncio.run_coroutine_threadsafe(pump(), self._background_loop())
+        while True:
+            item = tokens.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def answer_sync(self, question: str) -> str:
+        return "".join(self.stream_sync(question)).strip()
+
+
+async def _answer_all(service: QAService, questions: List[str]):
+    start = time.perf_counter()
+    answers = await asyncio.gather(*(service.answer(question) for question in questions))
+    for question, answer in zip(questions, answers):
+        print(f"\n❓ {question}\n🤖 {answer}")
+    print(f"\n⏱️ {len(questions)} questions in {time.perf_counter() - start:.1f}s ({service.stats})")
+
+
+async def _interactive(warmup: Warmup):
+    while True:
+        question = await asyncio.to_thread(input, "\nEnter your medical question (or 'quit' to exit): ")
+        if question.lower() in ['quit', 'exit']:
+            break
+        service = await asyncio.to_thread(warmup.result)
+        print("\n🤖 Answer: ", end="", flush=True)
+        async for token in service.stream(question):
+            print(token, end="", flush=True)
+        print()
+
+
+if __name__ == "__main__":
+    # Load the model and index while the first question is being typed
+    warmup = start_service_warmup()
+    if sys.argv[1:]:
+        asyncio.run(_answer_all(warmup.result(), sys.argv[1:]))
+    else:
+        asyncio.run(_interactive(warmup))
+    if warmup.ready:
+        print_report(warmup.report())
+        warmup.result().qa.compact()
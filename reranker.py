@@ -0,0 +1,142 @@
+"""
+This module contains the CrossEncoderReranker used by HybridRetriever to
+re-order its fused candidates before the top k go into the prompt.
+
+A small CPU cross-encoder scores each (question, chunk) pair. Scores are
+cached by normalized question and chunk id (chunk ids are content hashes), so
+repeated and paraphrased-by-case questions cost nothing. Scoring is held to a
+latency budget: from the p95 time per pair seen so far, only as many uncached
+candidates are scored as fit in `budget_ms`; if that leaves fewer than k, the
+fused order is used unchanged. Every `probe_every`th skipped query is re-ranked
+anyway, so the estimate can recover after a slow spell (e.g. a busy CPU).
+
+DOCBOT_RERANK=0 disables re-ranking; DOCBOT_RERANK_MODEL and
+DOCBOT_RERANK_BUDGET_MS override the model and the budget.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+from topic_resolver import normalize
+from tracing import RollingHistogram, tracer
+
+RERANK_MODEL_NAME = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+
+def _load_cross_encoder(model_name: str):
+    from sentence_transformers import CrossEncoder
+    print(f"🧠 Loading re-ranking model {model_name}...")
+    return CrossEncoder(model_name, device="cpu")
+
+
+class CrossEncoderReranker:
+    def __init__(self, model_name: str = RERANK_MODEL_NAME, budget_ms: float = 150.0,
+                 cache_size: int = 50_000, probe_every: int = 50, model_factory: Optional[Callable[[], object]] = None):
+        """`model_factory` returns an object with CrossEncoder's predict(pairs) -> scores."""
+        self.model_name = model_name
+        self.budget_ms = budget_ms
+        self.cache_size = cache_size
+        self.probe_every = probe_every
+        self._over_budget = 0
+        self.model_factory = model_factory or (lambda: _load_cross_encoder(model_name))
+        self._model = None
+        self._unavailable = False
+        self._model_lock = threading.Lock()
+        self._scores: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.pair_latency = RollingHistogram(window=256)
+        self.stats = {"reranked": 0, "skipped": 0, "pairs_scored": 0, "cache_hits": 0}
+
+    @property
+    def model(self):
+        """The cross-encoder, or None if it can't be loaded (re-ranking is then skipped)."""
+        if self._model is None and not self._unavailable:
+            with self._model_lock:
+                if self._model is None and not self._unavailable:
+                    try:
+                        self._model = self.model_factory()
+                    except Exception as e:
+                        print(f"⚠️ Re-ranking disabled, could not load {self.model_name}: {e}")
+                        self._unavailable = True
+        return self._model
+
+    def affordable_pairs(self) -> Optional[int]:
+        """Uncached pairs that fit in the budget at the p95 time per pair, or None if unmeasured."""
+        if not self.pair_latency.count:
+            return None
+        p95_ms = self.pair_latency.quantiles()[0.95] * 1000
+        return int(self.budget_ms // p95_ms) if p95_ms > 0 else None
+
+    def _score(self, query_key: str, query: str, candidates: Sequence[Tuple[str, Document]]) -> List[float]:
+        pairs = [(query, doc.page_content) for _, doc in candidates]
+        start = time.perf_counter()
+        scores = [float(score) for score in self.model.predict(pairs)]
+        elapsed = time.perf_counter() - start
+        tracer.observe("rerank_model", elapsed)
+        with self._lock:
+            self.pair_latency.add(elapsed / len(pairs))
+            self.stats["pairs_scored"] += len(pairs)
+            for (doc_id, _), score in zip(candidates, scores):
+                self._scores[(query_key, doc_id)] = score
+            while len(self._scores) > self.cache_size:
+                self._scores.popitem(last=False)
+        return scores
+
+    def rerank(self, query: str, candidates: Sequence[Tuple[str, Document]], k: int) -> List[Document]:
+        """
+        The top `k` of `candidates` ((chunk id, Document) in retrieval order) by
+        cross-encoder score, or the first `k` unchanged if re-ranking is skipped.
+        """
+        if len(candidates) <= 1 or self.model is None:
+            return [doc for _, doc in candidates[:k]]
+
+        query_key = normalize(query)
+        affordable = self.affordable_pairs()
+        scores, uncached = {}, []
+        with self._lock:
+            for doc_id, doc in candidates:
+                score = self._scores.get((query_key, doc_id))
+                if score is not None:
+                    self._scores.move_to_end((query_key, doc_id))
+                    scores[doc_id] = score
+                elif affordable is None or len(uncached) < affordable:
+                    uncached.append((doc_id, doc))
+            self.stats["cache_hits"] += len(scores)
+
+        if len(scores) + len(uncached) < min(k, len(candidates)):
+            # Scoring enough candidates would blow the latency budget
+            self._over_budget += 1
+            if self._over_budget % self.probe_every:
+                self.stats["skipped"] += 1
+                tracer.count("rerank_skipped")
+                return [doc for _, doc in candidates[:k]]
+            uncached = [item for item in candidates if item[0] not in scores][:k]
+
+        tracer.count("rerank_cache_hits", len(scores))
+        if uncached:
+            scores.update(zip((doc_id for doc_id, _ in uncached), self._score(query_key, query, uncached)))
+        self.stats["reranked"] += 1
+        ranked = sorted((item for item in candidates if item[0] in scores), key=lambda item: -scores[item[0]])
+        return [doc for _, doc in ranked[:k]]
+
+
+_shared_reranker: Optional[CrossEncoderReranker] = None
+_shared_lock = threading.Lock()
+
+def get_reranker() -> Optional[CrossEncoderReranker]:
+    """The process-wide re-ranker, or None if DOCBOT_RERANK=0."""
+    global _shared_reranker
+    if os.getenv("DOCBOT_RERANK", "1") in ("", "0", "false"):
+        return None
+    with _shared_lock:
+        if _shared_reranker is None:
+            _shared_reranker = CrossEncoderReranker(
+                model_name=os.getenv("DOCBOT_RERANK_MODEL", RERANK_MODEL_NAME),
+                budget_ms=float(os.getenv("DOCBOT_RERANK_BUDGET_MS", 150)),
+            )
+        return _shared_reranker
@@ -0,0 +1,187 @@
+"""
+This module contains the retrievers used by MedicalQA.
+"""
+
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.retrievers import BaseRetriever
+from langchain_community.vectorstores import FAISS
+from pydantic import ConfigDict
+
+from bm25_index import BM25Index, reciprocal_rank_fusion
+from reranker import CrossEncoderReranker
+from topic_resolver import TopicResolver
+from tracing import tracer
+
+
+def dense_search(db: FAISS, query_vector, k: int, params=None) -> List[Tuple[str, float]]:
+    """
+    Search the FAISS index directly and return (docstore id, distance) pairs.
+    `params` may restrict the search to a subset of vectors (see TopicPartitions).
+    """
+    return dense_search_batch(db, [query_vector], k, params)[0]
+
+
+def dense_search_batch(db: FAISS, query_vectors, k: int, params=None) -> List[List[Tuple[str, float]]]:
+    """dense_search for many queries with a single FAISS call."""
+    vectors = np.asarray(query_vectors, dtype=np.float32)
+    if db._normalize_L2:
+        vectors = vectors.copy()
+        faiss.normalize_L2(vectors)
+    distances, positions = db.index.search(vectors, k, params=params)
+    return [
+        [
+            (db.index_to_docstore_id[position], float(distance))
+            for position, distance in zip(row_positions, row_distances)
+            if position != -1
+        ]
+        for row_positions, row_distances in zip(positions, distances)
+    ]
+
+
+class TopicPartitions:
+    """
+    Inverted map from chunk topic to FAISS vector positions.
+
+    Searching a partition passes an IDSelector to FAISS, so only that topic's
+    vectors are scored.
+    """
+
+    def __init__(self, db: FAISS):
+        self.index = db.index
+        self.names: Dict[str, str] = {}
+        positions: Dict[str, List[int]] = {}
+        if hasattr(db.docstore, "metadata_values"):
+            topics = db.docstore.metadata_values('topic')
+        else:
+            topics = {doc_id: doc.metadata.get('topic') for doc_id, doc in db.docstore._dict.items()}
+        for position, doc_id in db.index_to_docstore_id.items():
+            topic = topics.get(doc_id)
+            if topic:
+                key = topic.casefold()
+                self.names.setdefault(key, topic)
+                positions.setdefault(key, []).append(position)
+        self.positions = {key: np.asarray(ids, dtype=np.int64) for key, ids in positions.items()}
+        self.doc_ids: Dict[str, Set[str]] = {
+            key: {db.index_to_docstore_id[position] for position in ids} for key, ids in positions.items()
+        }
+        self._params: Dict[str, object] = {}
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def size(self, topic: str) -> int:
+        ids = self.positions.get(topic.casefold())
+        return 0 if ids is None else len(ids)
+
+    def search_params(self, topic: str):
+        """FAISS search parameters restricted to one topic's vectors."""
+        key = topic.casefold()
+        if key not in self._params:
+            selector = faiss.IDSelectorBatch(self.positions[key])
+            ivf = faiss.try_extract_index_ivf(self.index)
+            if ivf is not None:
+                self._params[key] = faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+            else:
+                self._params[key] = faiss.SearchParameters(sel=selector)
+        return self._params[key]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Dense FAISS search fused with BM25 using reciprocal rank fusion.
+    Each side contributes its top `candidate_k`; the fused top `k` are returned.
+
+    When the question names a topic (by name or synonym, see TopicResolver)
+    that has at least `k` chunks, both searches
+    are restricted to that topic's partition; otherwise the whole index is used.
+
+    With a `reranker`, the fused top `rerank_pool` go to the cross-encoder
+    and its top `k` are returned instead.
+    """
+
+    vectorstore: FAISS
+    bm25: Optional[BM25Index] = None
+    partitions: Optional[TopicPartitions] = None
+    topic_resolver: Optional[TopicResolver] = None
+    k: int = 3
+    candidate_k: int = 20
+    rrf_k: int = 60
+    reranker: Optional[CrossEncoderReranker] = None
+    rerank_pool: int = 30
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    def _topic(self, query: str) -> Optional[str]:
+        """The topic partition to search for `query`, if any."""
+        if self.partitions is None or self.topic_resolver is None:
+            return None
+        topic = self.topic_resolver.match_keywords(query)
+        if topic is not None and self.partitions.size(topic) < self.k:
+            return None
+        return topic
+
+    def _pool_size(self) -> int:
+        """Fused candidates to fetch: the top k, or the re-ranking pool."""
+        return self.k if self.reranker is None else max(self.k, self.rerank_pool)
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        topic = self._topic(query)
+        tracer.annotate("partition", topic)
+        candidate_k = max(self.candidate_k, self._pool_size())
+        with tracer.span("embed_query"):
+            query_vector = self.vectorstore.embeddings.embed_query(query)
+        params = self.partitions.search_params(topic) if topic else None
+        with tracer.span("faiss_search"):
+            dense_ids = [doc_id for doc_id, _ in dense_search(self.vectorstore, query_vector, candidate_k, params)]
+        return self._fuse(query, topic, dense_ids)
+
+    def retrieve_batch(self, queries: Sequence[str], query_vectors) -> List[List[Document]]:
+        """
+        Documents for each query, given its embedding. Dense search runs as one
+        FAISS call per topic partition (plus one for unpartitioned queries)
+        instead of one per query.
+        """
+        topics = [self._topic(query) for query in queries]
+        candidate_k = max(self.candidate_k, self._pool_size())
+        vectors = np.asarray(query_vectors, dtype=np.float32)
+        groups: Dict[Optional[str], List[int]] = {}
+        for position, topic in enumerate(topics):
+            groups.setdefault(topic, []).append(position)
+
+        dense_ids: List[List[str]] = [[] for _ in queries]
+        with tracer.span("faiss_search_batch"):
+            for topic, positions in groups.items():
+                params = self.partitions.search_params(topic) if topic else None
+                hits = dense_search_batch(self.vectorstore, vectors[positions], candidate_k, params)
+                for position, row in zip(positions, hits):
+                    dense_ids[position] = [doc_id for doc_id, _ in row]
+        return [self._fuse(query, topic, ids) for query, topic, ids in zip(queries, topics, dense_ids)]
+
+    def _fuse(self, query: str, topic: Optional[str], dense_ids: List[str]) -> List[Document]:
+        """BM25 search, RRF fusion with the dense ranking, chunk fetch and re-ranking."""
+        wanted = self._pool_size()
+        candidate_k = max(self.candidate_k, wanted)
+        rankings = [dense_ids]
+        if self.bm25 is not None:
+            with tracer.span("bm25_search"):
+                allowed = self.partitions.doc_ids[topic.casefold()] if topic else None
+                rankings.append([doc_id for doc_id, _ in self.bm25.search(query, candidate_k, allowed)])
+
+        candidates = []
+        with tracer.span("fetch_chunks"):
+            for doc_id, _ in reciprocal_rank_fusion(rankings, k=self.rrf_k):
+                doc = self.vectorstore.docstore.search(doc_id)
+                if isinstance(doc, Document):
+                    candidates.append((doc_id, doc))
+                if len(candidates) == wanted:
+                    break
+
+        if self.reranker is None:
+            return [doc for _, doc in candidates]
+        with tracer.span("rerank"):
+            return self.reranker.rerank(query, candidates, self.k)
@@ -0,0 +1,126 @@
+"""
+This module contains the SemanticCache class, which returns previous answers
+for questions that are near-duplicates of ones already answered.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+class SemanticCache:
+    """
+    Answer cache keyed by question embeddings.
+
+    Question vectors are L2-normalised and kept in a fixed-size matrix, so a
+    lookup is one matrix-vector product. Entries are evicted least-recently-used
+    once `max_entries` is reached and expire after `ttl` seconds. Each entry
+    remembers the topics its answer was built from, so a topic refresh can drop
+    the answers it makes stale.
+    """
+
+    def __init__(self, embed_model, threshold: float = 0.9, max_entries: int = 1024, ttl: float = 3600.0):
+        self.embed_model = embed_model
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._vectors: Optional[np.ndarray] = None
+        self._entries: "OrderedDict[int, Dict]" = OrderedDict()
+        self._free_slots: List[int] = list(range(max_entries - 1, -1, -1))
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "invalidations": 0}
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def embed(self, question: str) -> np.ndarray:
+        vector = np.asarray(self.embed_model.embed_query(question), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, question: str, vector: Optional[np.ndarray] = None) -> Tuple[Optional[str], np.ndarray]:
+        """
+        Return (cached answer or None, question vector).
+        The vector is returned so a miss can be stored without re-embedding.
+        """
+        if vector is None:
+            vector = self.embed(question)
+
+        with self._lock:
+            self._expire()
+            if not self._entries:
+                self.stats["misses"] += 1
+                return None, vector
+
+            slots = np.fromiter((entry["slot"] for entry in self._entries.values()), dtype=np.int64)
+            scores = self._vectors[slots] @ vector
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.stats["misses"] += 1
+                return None, vector
+
+            entry_id = list(self._entries.keys())[best]
+            self._entries.move_to_end(entry_id)
+            self.stats["hits"] += 1
+            return self._entries[entry_id]["answer"], vector
+
+    def store(self, question: str, answer: str, topics: Iterable[str], vector: Optional[np.ndarray] = None):
+        if vector is None:
+            vector = self.embed(question)
+
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+            if not self._free_slots:
+                self._evict(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+
+            slot = self._free_slots.pop()
+            self._vectors[slot] = vector
+            self._entries[slot] = {
+                "slot": slot,
+                "question": question,
+                "answer": answer,
+                "topics": {topic.casefold() for topic in topics if topic},
+                "created": time.monotonic(),
+            }
+            self.stats["stores"] += 1
+
+    def invalidate_topic(self, topic: str) -> int:
+        """
+        Drop answers built from `topic` or whose question mentions it.
+        Returns the number of entries removed.
+        """
+        key = topic.casefold()
+        with self._lock:
+            stale = [
+                entry_id for entry_id, entry in self._entries.items()
+                if key in entry["topics"] or key in entry["question"].casefold()
+            ]
+            for entry_id in stale:
+                self._evict(entry_id)
+            self.stats["invalidations"] += len(stale)
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            for entry_id in list(self._entries):
+                self._evict(entry_id)
+
+    def _evict(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        self._free_slots.append(entry["slot"])
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.ttl
+        expired = [entry_id for entry_id, entry in self._entries.items() if entry["created"] < cutoff]
+        for entry_id in expired:
+            self._evict(entry_id)
@@ -0,0 +1,142 @@
+"""
+This module contains the SemanticChunker, which splits documents into chunks
+at topic shifts instead of every 512 characters.
+
+Each document is split into sentences (paragraph breaks are kept). Whole
+documents are grouped into batches of about `batch_size` sentences, which are
+streamed through the EmbeddingPipeline (so the embedding cache, worker
+processes and progress output of index builds apply), and the cosine
+similarity of each pair of neighbouring sentences is computed per batch as it
+arrives; only the batches in flight are held in memory. A chunk
+ends where the similarity drops below the document's `breakpoint_percentile`
+(or at a paragraph break) once it holds `min_tokens`, and always before it
+would exceed `max_tokens`.
+
+Boundaries depend only on the document's own sentences, so an article chunks
+the same way in a full build and in a runtime topic refresh, and chunk ids stay
+stable.
+"""
+
+import re
+from collections import deque
+from typing import Iterator, List, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from context_packer import estimate_tokens
+from embedding_pipeline import EmbeddingPipeline
+
+_PARAGRAPH = re.compile(r"\n\s*\n")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=\S)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def split_sentences(text: str) -> List[Tuple[str, bool]]:
+    """(sentence, starts a paragraph) pairs. Line breaks inside a paragraph (e.g. PDF lines) are joined."""
+    sentences = []
+    for paragraph in _PARAGRAPH.split(text):
+        paragraph = _WHITESPACE.sub(" ", paragraph).strip()
+        if not paragraph:
+            continue
+        for position, sentence in enumerate(_SENTENCE_END.split(paragraph)):
+            sentences.append((sentence, position == 0))
+    return sentences
+
+
+class SemanticChunker:
+    def __init__(self, embed_model, max_tokens: int = 192, min_tokens: int = 64,
+                 breakpoint_percentile: float = 25.0, batch_size: int = 256, workers: int = 1):
+        self.embed_model = embed_model
+        self.max_tokens = max_tokens
+        self.min_tokens = min_tokens
+        self.breakpoint_percentile = breakpoint_percentile
+        self.batch_size = batch_size
+        self.pipeline = EmbeddingPipeline(embed_model, batch_size=batch_size, workers=workers)
+
+    def _pieces(self, text: str) -> List[Tuple[str, bool]]:
+        """Sentences, with any longer than max_tokens cut into word windows (and words into slices) that fit."""
+        pieces = []
+        max_chars = self.max_tokens * 4
+        for sentence, paragraph_start in split_sentences(text):
+            if estimate_tokens(sentence) <= self.max_tokens:
+                pieces.append((sentence, paragraph_start))
+                continue
+            window = ""
+            for word in sentence.split(" "):
+                if window and len(window) + 1 + len(word) > max_chars:
+                    pieces.append((window, paragraph_start))
+                    window, paragraph_start = "", False
+                while len(word) > max_chars:
+                    # A single over-long token (URL, chemical name): cut it into slices that fit
+                    if window:
+                        pieces.append((window, paragraph_start))
+                        window, paragraph_start = "", False
+                    pieces.append((word[:max_chars], paragraph_start))
+                    word, paragraph_start = word[max_chars:], False
+                window = f"{window} {word}" if window else word
+            if window:
+                pieces.append((window, paragraph_start))
+        return pieces
+
+    def _group(self, pieces: List[Tuple[str, bool]], similarities: np.ndarray) -> List[str]:
+        """Chunk texts for one document; similarities[i] is between pieces i and i + 1."""
+        boundary = np.zeros(len(pieces), dtype=bool)
+        if len(similarities):
+            boundary[1:] = similarities < np.percentile(similarities, self.breakpoint_percentile)
+        boundary |= np.fromiter((start for _, start in pieces), dtype=bool, count=len(pieces))
+
+        chunks, current, tokens = [], "", 0
+        for (sentence, paragraph_start), cut in zip(pieces, boundary):
+            cost = estimate_tokens(sentence)
+            if current and (tokens + cost > self.max_tokens or (cut and tokens >= self.min_tokens)):
+                chunks.append(current)
+                current, tokens = "", 0
+            if current:
+                current += "\n\n" if paragraph_start else " "
+            current += sentence
+            tokens += cost
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def _split_group(self, documents: List[Document], pieces: List[List[Tuple[str, bool]]], vectors) -> List[Document]:
+        """Chunks of a group of documents, given the vectors of all their sentences in order."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms == 0, 1, norms)
+        neighbour_similarity = np.einsum("ij,ij->i", vectors[:-1], vectors[1:])
+
+        chunks, start = [], 0
+        for doc, doc_pieces in zip(documents, pieces):
+            end = start + len(doc_pieces)
+            texts = self._group(doc_pieces, neighbour_similarity[start:max(start, end - 1)])
+            for chunk_index, text in enumerate(texts):
+                chunks.append(Document(page_content=text, metadata={**doc.metadata, "chunk_index": chunk_index}))
+            start = end
+        return chunks
+
+    def split_documents(self, documents: List[Document]) -> List[Document]:
+        pending = deque()
+
+        def sentence_batches() -> Iterator[List[str]]:
+            group, group_pieces, size = [], [], 0
+            for doc in documents:
+                pieces = self._pieces(doc.page_content)
+                if not pieces:
+                    continue
+                if group and size + len(pieces) > self.batch_size:
+                    pending.append((group, group_pieces))
+                    yield [sentence for doc_pieces in group_pieces for sentence, _ in doc_pieces]
+                    group, group_pieces, size = [], [], 0
+                group.append(doc)
+                group_pieces.append(pieces)
+                size += len(pieces)
+            if group:
+                pending.append((group, group_pieces))
+                yield [sentence for doc_pieces in group_pieces for sentence, _ in doc_pieces]
+
+        chunks = []
+        for vectors in self.pipeline.embed_batches(sentence_batches(), unit="sentences"):
+            chunks.extend(self._split_group(*pending.popleft(), vectors))
+        return chunks
@@ -0,0 +1,162 @@
+"""
+This module contains the Warmup class, which loads DocBot's heavy parts
+(langchain/Groq/FAISS imports, the embedding and re-ranking models, the index)
+on a background thread so the UI or CLI can come up before they are ready, and
+measures how long each stage of the cold start took.
+
+It only imports the standard library and tracing, so importing it is cheap.
+
+Usage:
+    python startup.py                           # measure a cold start
+    python startup.py --save-embedding-snapshot # save the model locally for faster starts
+"""
+
+import argparse
+import importlib
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from tracing import tracer
+
+
+def process_start_time() -> float:
+    """Wall-clock time the interpreter started (Linux), or when this module was imported."""
+    try:
+        with open("/proc/self/stat", "r") as f:
+            # Field 22 is the start time in clock ticks since boot; the command
+            # name in field 2 may contain spaces, so count from its closing ')'
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/stat", "r") as f:
+            boot_time = next(int(line.split()[1]) for line in f if line.startswith("btime"))
+        return boot_time + start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, StopIteration):
+        return _IMPORTED_AT
+
+
+_IMPORTED_AT = time.time()
+PROCESS_START = process_start_time()
+
+
+class Warmup:
+    """
+    Runs `stages` ((name, callable) pairs) in order on a daemon thread. The last
+    stage's return value is the result; `result()` blocks until it is there.
+    """
+
+    def __init__(self, stages: Sequence[Tuple[str, Callable[[], Any]]]):
+        self.stages = list(stages)
+        self.timings_ms: Dict[str, float] = {}
+        self.stage: Optional[str] = None
+        self.error: Optional[BaseException] = None
+        self.started_at: Optional[float] = None
+        self.ready_at: Optional[float] = None
+        self._result: Any = None
+        self._done = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "Warmup":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name="docbot-warmup", daemon=True)
+            self._thread.start()
+        return self
+
+    def run(self):
+        self.started_at = time.time()
+        try:
+            for name, load in self.stages:
+                self.stage = name
+                start = time.perf_counter()
+                self._result = load()
+                elapsed = time.perf_counter() - start
+                self.timings_ms[name] = elapsed * 1000
+                tracer.observe(f"startup_{name}", elapsed)
+            self.stage = None
+            print(f"🚀 Warm-up finished in {sum(self.timings_ms.values()):.0f} ms")
+        except BaseException as e:
+            self.error = e
+            print(f"❌ Warm-up failed during {self.stage}: {e}")
+        finally:
+            self.ready_at = time.time()
+            self._done.set()
+
+    @property
+    def ready(self) -> bool:
+        return self._done.is_set() and self.error is None
+
+    def result(self, timeout: Optional[float] = None) -> Any:
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"Warm-up still running ({self.stage})")
+        if self.error is not None:
+            raise self.error
+        return self._result
+
+    def status(self) -> str:
+        if not self._done.is_set():
+            return f"loading {self.stage or 'startup'}..."
+        return "failed" if self.error is not None else "ready"
+
+    def report(self) -> Dict[str, Any]:
+        """Per-stage times and time from process start until ready, in ms."""
+        report: Dict[str, Any] = {"stages": {name: round(ms, 1) for name, ms in self.timings_ms.items()}}
+        if self.ready_at is not None:
+            report["ready_after_ms"] = round((self.ready_at - PROCESS_START) * 1000, 1)
+            report["warmup_ms"] = round((self.ready_at - self.started_at) * 1000, 1)
+        return report
+
+
+def warm_embedding_model():
+    """Build the embedding model now rather than on the first cache miss."""
+    from embedding_cache import get_embedding_model
+    get_embedding_model().model.embed_query("warm up")
+
+
+def warm_reranker():
+    """Load the re-ranking cross-encoder, if re-ranking is enabled."""
+    from reranker import get_reranker
+    reranker = get_reranker()
+    if reranker is not None:
+        reranker.model
+
+
+def service_stages(max_concurrency: int = 8) -> List[Tuple[str, Callable[[], Any]]]:
+    """Stages that end with a ready QAService, as used by docbot.py."""
+    def load_service():
+        return importlib.import_module("qa_service").QAService(max_concurrency=max_concurrency)
+
+    return [
+        ("imports", lambda: importlib.import_module("qa_service")),
+        ("embedding_model", warm_embedding_model),
+        ("reranker", warm_reranker),
+        ("index_and_llm", load_service),
+    ]
+
+
+def start_service_warmup(max_concurrency: int = 8) -> Warmup:
+    return Warmup(service_stages(max_concurrency)).start()
+
+
+def print_report(report: Dict[str, Any]):
+    print("🚀 Cold start")
+    for name, ms in report["stages"].items():
+        print(f"   {name:<16} {ms:8.0f} ms")
+    if "ready_after_ms" in report:
+        print(f"   ready {report['ready_after_ms']:.0f} ms after process start")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure DocBot's cold start.")
+    parser.add_argument("--save-embedding-snapshot", action="store_true",
+                        help="Save the embedding model locally (so later starts skip the hub) and exit.")
+    args = parser.parse_args()
+
+    if args.save_embedding_snapshot:
+        from embedding_cache import save_embedding_snapshot
+        save_embedding_snapshot()
+        raise SystemExit(0)
+
+    warmup = Warmup(service_stages())
+    warmup.run()
+    warmup.result()
+    print_report(warmup.report())
@@ -0,0 +1,222 @@
+"""
+This module contains the TopicResolver class, which maps a question to one of
+the known health topics without an LLM call.
+
+Topic names and synonyms are matched with an Aho-Corasick automaton in one
+pass over the question; if nothing matches, the question embedding is compared
+against embeddings of the topic names.
+"""
+
+import re
+import threading
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Lay terms and abbreviations for topics in data_fetcher.TOP_TOPICS.
+# Bracketed parts and "/"-separated names are picked up automatically.
+TOPIC_SYNONYMS: Dict[str, List[str]] = {
+    "Diabetes": ["diabetic", "blood sugar", "type 1 diabetes", "type 2 diabetes"],
+    "Hypertension": ["high blood pressure"],
+    "Depression": ["depressed", "depressive disorder"],
+    "Anxiety": ["anxious", "panic attack", "panic attacks"],
+    "Heart Disease": ["heart attack", "cardiovascular disease", "coronary artery disease"],
+    "High Cholesterol": ["cholesterol", "ldl", "hdl"],
+    "COVID-19": ["covid", "coronavirus", "sars cov 2"],
+    "Flu (Influenza)": ["the flu"],
+    "Alzheimer's Disease": ["alzheimer", "alzheimers"],
+    "Parkinson's Disease": ["parkinson", "parkinsons"],
+    "Acid Reflux (GERD)": ["heartburn", "reflux"],
+    "COPD": ["emphysema", "chronic bronchitis", "chronic obstructive pulmonary disease"],
+    "Sleep Disorders": ["insomnia", "sleep apnea"],
+    "Allergies": ["allergy", "allergic", "hay fever"],
+    "Autism": ["autistic", "autism spectrum disorder"],
+    "Bipolar Disorder": ["bipolar", "manic depression"],
+    "Colon Cancer": ["colorectal cancer"],
+    "UTI (Urinary Tract Infection)": ["bladder infection"],
+    "HIV/AIDS": ["hiv aids"],
+    "STDs": ["std", "sti", "stis", "sexually transmitted disease", "sexually transmitted infection"],
+    "ADHD": ["attention deficit"],
+    "Epilepsy": ["seizure", "seizures"],
+    "Kidney Disease": ["renal disease", "kidney failure"],
+    "Liver Disease": ["cirrhosis", "fatty liver"],
+    "Celiac Disease": ["coeliac", "gluten intolerance"],
+    "Crohn's Disease": ["crohn", "crohns"],
+    "Sickle Cell Disease": ["sickle cell"],
+    "Anemia": ["anaemia", "iron deficiency"],
+    "Thyroid Disorders": ["thyroid", "hypothyroidism", "hyperthyroidism"],
+    "PCOS": ["polycystic ovary syndrome", "polycystic ovarian syndrome"],
+    "Pregnancy": ["pregnant"],
+    "Vaccines": ["vaccine", "vaccination", "immunization"],
+    "Hearing Loss": ["deafness"],
+    "Ear Infections": ["otitis media"],
+    "Eczema": ["atopic dermatitis"],
+    "Shingles": ["herpes zoster"],
+    "ALS": ["lou gehrig", "amyotrophic lateral sclerosis"],
+    "Eating Disorders": ["binge eating"],
+    "Anorexia": ["anorexia nervosa"],
+    "Bulimia": ["bulimia nervosa"],
+    "Substance Abuse": ["drug abuse", "addiction"],
+    "Alcohol Use Disorder": ["alcoholism", "alcohol abuse"],
+    "Smoking Cessation": ["quit smoking", "quitting smoking"],
+    "Fractures": ["broken bone", "broken bones"],
+    "Weight Loss": ["lose weight", "losing weight"],
+}
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def normalize(text: str) -> str:
+    """Casefold, drop apostrophes and collapse everything else to single spaces."""
+    return _NON_WORD.sub(" ", text.casefold().replace("'", "").replace("’", "")).strip()
+
+
+def topic_aliases(topic: str, synonyms: Iterable[str] = ()) -> List[str]:
+    """
+    Normalised names a topic can be mentioned by: the full name, the parts
+    inside and outside brackets, "/"-separated names, listed synonyms, and a
+    plural form of each.
+    """
+    names = [topic, *synonyms]
+    bracketed = re.match(r"^(.*?)\s*\((.*?)\)\s*$", topic)
+    if bracketed:
+        names.extend(bracketed.groups())
+    if "/" in topic:
+        names.extend(topic.split("/"))
+
+    aliases = []
+    for name in names:
+        alias = normalize(name)
+        if alias:
+            aliases.append(alias)
+            if not alias.endswith("s"):
+                aliases.append(alias + "s")
+    return list(dict.fromkeys(aliases))
+
+
+class _AhoCorasick:
+    """
+    Aho-Corasick automaton over normalised aliases. Patterns and text are
+    padded with spaces, so matches always fall on word boundaries.
+    """
+
+    def __init__(self, patterns: Dict[str, str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.out: List[List[Tuple[int, str]]] = [[]]
+
+        for pattern, topic in patterns.items():
+            padded = f" {pattern} "
+            state = 0
+            for char in padded:
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.out[state].append((len(padded), topic))
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.out[child] = self.out[child] + self.out[self.fail[child]]
+
+    def longest_match(self, text: str) -> Optional[str]:
+        """Topic of the longest alias found in `text` (first one on ties)."""
+        best: Optional[Tuple[int, str]] = None
+        state = 0
+        for char in f" {text} ":
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            for length, topic in self.out[state]:
+                if best is None or length > best[0]:
+                    best = (length, topic)
+        return best[1] if best else None
+
+
+class TopicResolver:
+    """
+    Resolves the health topic a question is about.
+
+    `match_keywords` only returns a topic that is named in the question (or by
+    a synonym); `resolve` also falls back to the nearest topic-name embedding
+    when its cosine similarity is at least `threshold`.
+    """
+
+    def __init__(self, topics: Iterable[str], embed_model=None,
+                 synonyms: Dict[str, List[str]] = TOPIC_SYNONYMS, threshold: float = 0.6):
+        self.embed_model = embed_model
+        self.synonyms = synonyms
+        self.threshold = threshold
+        self.stats = {"keyword": 0, "embedding": 0, "unresolved": 0}
+        self._lock = threading.Lock()
+        self._topic_vectors: Optional[Tuple[List[str], np.ndarray]] = None
+        self._build(topics)
+
+    def _build(self, topics: Iterable[str]):
+        canonical: Dict[str, str] = {}
+        for topic in topics:
+            canonical.setdefault(topic.casefold(), topic)
+        patterns: Dict[str, str] = {}
+        for topic in canonical.values():
+            for alias in topic_aliases(topic, self.synonyms.get(topic, ())):
+                patterns.setdefault(alias, topic)
+        self.topics = list(canonical.values())
+        self._automaton = _AhoCorasick(patterns)
+        self._topic_vectors = None
+
+    def add_topic(self, topic: str):
+        """Make a topic learned at runtime resolvable."""
+        with self._lock:
+            if topic.casefold() not in {known.casefold() for known in self.topics}:
+                self._build([*self.topics, topic])
+
+    def match_keywords(self, question: str) -> Optional[str]:
+        return self._automaton.longest_match(normalize(question))
+
+    def _vectors(self) -> Tuple[List[str], np.ndarray]:
+        if self._topic_vectors is None:
+            names = [re.sub(r"\s*\(.*?\)", "", topic) for topic in self.topics]
+            matrix = np.asarray(self.embed_model.embed_documents(names), dtype=np.float32)
+            matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+            self._topic_vectors = (list(self.topics), matrix)
+        return self._topic_vectors
+
+    def match_embedding(self, question: str, question_vector=None) -> Optional[Tuple[str, float]]:
+        """Nearest topic by embedding and its cosine similarity, if above threshold."""
+        if self.embed_model is None:
+            return None
+        if question_vector is None:
+            question_vector = self.embed_model.embed_query(question)
+        vector = np.asarray(question_vector, dtype=np.float32)
+        vector = vector / (np.linalg.norm(vector) or 1.0)
+
+        topics, matrix = self._vectors()
+        scores = matrix @ vector
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+        return topics[best], float(scores[best])
+
+    def resolve(self, question: str, question_vector=None) -> Optional[str]:
+        topic = self.match_keywords(question)
+        if topic is not None:
+            self.stats["keyword"] += 1
+            return topic
+
+        match = self.match_embedding(question, question_vector)
+        if match is not None:
+            self.stats["embedding"] += 1
+            return match[0]
+
+        self.stats["unresolved"] += 1
+        return None
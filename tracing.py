@@ -0,0 +1,260 @@
+"""
+This module contains the Tracer used to time each stage of answering a
+question (embedding, FAISS search, LLM call, topic extraction, MedlinePlus
+fetch, index save) and to count tokens and cache hits per request.
+
+Tracing is off unless DOCBOT_TRACE=1. When it is on:
+  - every finished request is appended as one JSON line to DOCBOT_TRACE_FILE
+    (default traces.jsonl)
+  - rolling p50/p95/p99 per stage are kept in memory, and served in Prometheus
+    text format on http://localhost:$DOCBOT_METRICS_PORT/metrics if that is set
+
+When it is off, `span` hands back one shared no-op context manager and
+`count`/`annotate`/`observe` return immediately.
+"""
+
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Deque, Dict, Optional
+
+import numpy as np
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+_NOOP = nullcontext()
+_current_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("docbot_trace", default=None)
+
+
+class Trace:
+    """Stage timings (ms, summed over repeats), counters and attributes of one request."""
+
+    __slots__ = ("name", "started_at", "duration_ms", "stages", "counts", "attrs")
+
+    def __init__(self, name: str, attrs: Dict):
+        self.name = name
+        self.started_at = time.time()
+        self.duration_ms = 0.0
+        self.stages: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self.attrs = attrs
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration_ms, 3),
+            "stages": {stage: round(ms, 3) for stage, ms in self.stages.items()},
+            "counts": self.counts,
+            "attrs": self.attrs,
+        }
+
+
+class RollingHistogram:
+    """Last `window` samples of a stage, plus all-time count and sum."""
+
+    def __init__(self, window: int = 2048):
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value: float):
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+
+    def quantiles(self) -> Dict[float, float]:
+        if not self.samples:
+            return {q: 0.0 for q in QUANTILES}
+        values = np.quantile(np.fromiter(self.samples, dtype=np.float64), QUANTILES)
+        return dict(zip(QUANTILES, values.tolist()))
+
+
+class _Span:
+    __slots__ = ("tracer", "stage", "start")
+
+    def __init__(self, tracer: "Tracer", stage: str):
+        self.tracer = tracer
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+class _Request:
+    __slots__ = ("tracer", "trace", "token", "start")
+
+    def __init__(self, tracer: "Tracer", name: str, attrs: Dict):
+        self.tracer = tracer
+        self.trace = Trace(name, attrs)
+
+    def __enter__(self) -> Trace:
+        self.token = _current_trace.set(self.trace)
+        self.start = time.perf_counter()
+        return self.trace
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        try:
+            _current_trace.reset(self.token)
+        except ValueError:
+            # Closed from another context, e.g. an abandoned generator
+            pass
+        self.trace.duration_ms = elapsed * 1000
+        if exc_type is not None:
+            self.trace.attrs["error"] = exc_type.__name__
+        self.tracer._record(self.trace.name, elapsed)
+        self.tracer._finish(self.trace)
+        return False
+
+
+class Tracer:
+    def __init__(self, enabled: bool = False, path: Optional[str] = None, window: int = 2048):
+        self.enabled = enabled
+        self.path = path
+        self.window = window
+        self._histograms: Dict[str, RollingHistogram] = {}
+        self._totals: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @classmethod
+    def from_env(cls) -> "Tracer":
+        tracer = cls(
+            enabled=os.getenv("DOCBOT_TRACE", "0") not in ("", "0", "false"),
+            path=os.getenv("DOCBOT_TRACE_FILE", "traces.jsonl"),
+        )
+        port = os.getenv("DOCBOT_METRICS_PORT")
+        if tracer.enabled and port:
+            tracer.serve_metrics(int(port))
+        return tracer
+
+    @staticmethod
+    def current() -> Optional[Trace]:
+        return _current_trace.get()
+
+    def request(self, name: str, **attrs):
+        """Context manager tracing one request; spans inside it are attached to it."""
+        if not self.enabled:
+            return _NOOP
+        return _Request(self, name, attrs)
+
+    def span(self, stage: str):
+        """Context manager timing one stage."""
+        if not self.enabled:
+            return _NOOP
+        return _Span(self, stage)
+
+    def observe(self, stage: str, seconds: float):
+        """Record a stage duration measured elsewhere."""
+        if not self.enabled:
+            return
+        trace = _current_trace.get()
+        if trace is not None:
+            with self._lock:
+                trace.stages[stage] = trace.stages.get(stage, 0.0) + seconds * 1000
+        self._record(stage, seconds)
+
+    def count(self, key: str, n: int = 1):
+        if not self.enabled:
+            return
+        trace = _current_trace.get()
+        with self._lock:
+            if trace is not None:
+                trace.counts[key] = trace.counts.get(key, 0) + n
+            self._totals[key] = self._totals.get(key, 0) + n
+
+    def annotate(self, key: str, value):
+        if not self.enabled:
+            return
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.attrs[key] = value
+
+    def _record(self, stage: str, seconds: float):
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = RollingHistogram(self.window)
+            histogram.add(seconds)
+
+    def _finish(self, trace: Trace):
+        if not self.path:
+            return
+        line = json.dumps(trace.to_dict(), ensure_ascii=False)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def reset(self):
+        """Forget all recorded stage timings and counters."""
+        with self._lock:
+            self._histograms.clear()
+            self._totals.clear()
+
+    def totals(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._totals)
+
+    def percentiles(self) -> Dict[str, Dict[str, float]]:
+        """{stage: {"p50", "p95", "p99" (ms), "count"}} over each stage's rolling window."""
+        with self._lock:
+            histograms = {stage: (h.quantiles(), h.count) for stage, h in self._histograms.items()}
+        return {
+            stage: {**{f"p{int(q * 100)}": value * 1000 for q, value in quantiles.items()}, "count": count}
+            for stage, (quantiles, count) in sorted(histograms.items())
+        }
+
+    def prometheus_text(self) -> str:
+        lines = [
+            "# HELP docbot_stage_seconds Time spent per request stage.",
+            "# TYPE docbot_stage_seconds summary",
+        ]
+        with self._lock:
+            for stage, histogram in sorted(self._histograms.items()):
+                for q, value in histogram.quantiles().items():
+                    lines.append(f'docbot_stage_seconds{{stage="{stage}",quantile="{q}"}} {value:.6f}')
+                lines.append(f'docbot_stage_seconds_sum{{stage="{stage}"}} {histogram.total:.6f}')
+                lines.append(f'docbot_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+            lines += ["# HELP docbot_events_total Tokens, cache hits and other counted events.",
+                      "# TYPE docbot_events_total counter"]
+            for key, total in sorted(self._totals.items()):
+                lines.append(f'docbot_events_total{{event="{key}"}} {total}')
+        return "\n".join(lines) + "\n"
+
+    def serve_metrics(self, port: int):
+        """Serve prometheus_text() at /metrics from a daemon thread."""
+        tracer = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") != "/metrics":
+                    self.send_error(404)
+                    return
+                body = tracer.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), MetricsHandler)
+        threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True).start()
+        print(f"📈 Serving metrics on http://127.0.0.1:{port}/metrics")
+        return self._server
+
+
+tracer = Tracer.from_env()
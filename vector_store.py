@@ -0,0 +1,331 @@
+"""
+This module contains helpers for storing, loading and compressing the FAISS
+vector store on disk.
+
+Layout of the index folder:
+  index.faiss             flat float32 index, kept exact for incremental builds
+  index.compressed.faiss  optional SQ8 / IVF-PQ copy with the same vector order
+  chunks.sqlite           position -> docstore id map and chunk metadata (shared)
+  chunks.txt              chunk texts, read lazily (see chunk_store.py)
+  updates.wal             chunks added at runtime since the last snapshot (see index_wal.py)
+
+Older folders with FAISS.save_local's pickled index.pkl are converted to the
+chunk store the first time they are loaded.
+"""
+
+import os
+import pickle
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from chunk_store import ChunkStore, LazyDocstore, write_chunk_store
+from index_wal import IndexWAL, WALRecord
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+
+FLAT_INDEX_NAME = "index.faiss"
+COMPRESSED_INDEX_NAME = "index.compressed.faiss"
+LEGACY_DOCSTORE_NAME = "index.pkl"
+INDEX_TYPES = ("flat", "sq8", "ivfpq")
+# Lowest recall@10 against exact search for a compressed index to be exported
+MIN_RECALL = 0.9
+
+
+def _atomic_write(path: str, write_fn):
+    """Write to a temp file and rename it over `path`, so readers (and
+    memory-mapped replicas) never see a half-written file."""
+    tmp_path = f"{path}.tmp"
+    write_fn(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def index_file_name(index) -> str:
+    """File an index is saved to: flat indexes are the exact copy, anything else is compressed."""
+    return FLAT_INDEX_NAME if isinstance(index, faiss.IndexFlat) else COMPRESSED_INDEX_NAME
+
+
+def save_vector_store(db: FAISS, folder: str, keep_compressed: bool = False,
+                      wal_records: Sequence[WALRecord] = ()):
+    """
+    Save the index and write its documents as a new chunk store, atomically.
+
+    Saving the flat index removes the compressed copy, whose vector order may
+    no longer match, unless the caller knows both still agree; index builds
+    export a fresh one when asked to. Saving a compressed index appends the
+    chunks in `wal_records` (the log being folded into this snapshot) to the
+    flat index, so it stays the exact copy of the same documents.
+    """
+    os.makedirs(folder, exist_ok=True)
+    index_name = index_file_name(db.index)
+    compressed_path = os.path.join(folder, COMPRESSED_INDEX_NAME)
+    if index_name == FLAT_INDEX_NAME and not keep_compressed and os.path.exists(compressed_path):
+        os.remove(compressed_path)
+    # Documents first: if the index write is interrupted, the chunks missing
+    # from it are still in the update log and are replayed on load
+    write_chunk_store(folder, (
+        (position, doc_id, db.docstore.search(doc_id))
+        for position, doc_id in sorted(db.index_to_docstore_id.items())
+    ))
+    if index_name == COMPRESSED_INDEX_NAME:
+        _catch_up_flat_index(db, folder, wal_records)
+    _atomic_write(os.path.join(folder, index_name), lambda path: faiss.write_index(db.index, path))
+
+
+def docstore_exists(folder: str) -> bool:
+    return ChunkStore.exists(folder) or os.path.exists(os.path.join(folder, LEGACY_DOCSTORE_NAME))
+
+
+def load_docstore(folder: str) -> Tuple[LazyDocstore, Dict[int, str]]:
+    """
+    Open the chunk store in `folder`, returning (docstore, position -> id map).
+    A legacy index.pkl is converted once and removed, so it is never unpickled again.
+    """
+    legacy_path = os.path.join(folder, LEGACY_DOCSTORE_NAME)
+    if not ChunkStore.exists(folder) and os.path.exists(legacy_path):
+        print(f"📦 Converting {LEGACY_DOCSTORE_NAME} to a chunk store...")
+        with open(legacy_path, "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        write_chunk_store(folder, (
+            (position, doc_id, docstore.search(doc_id))
+            for position, doc_id in sorted(index_to_docstore_id.items())
+        ))
+        os.remove(legacy_path)
+
+    store = ChunkStore(folder)
+    return LazyDocstore(store), store.index_to_docstore_id()
+
+
+def read_index(path: str, mmap: bool = False):
+    """
+    Read a FAISS index, memory-mapping its codes when possible so every
+    process serving the same file shares its pages. Flat and SQ8 indexes are
+    mapped; IVF indexes are small and load into memory.
+    """
+    mmap_flag = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+    if mmap and mmap_flag is not None:
+        index = faiss.read_index(path, mmap_flag | faiss.IO_FLAG_READ_ONLY)
+        if faiss.try_extract_index_ivf(index) is None:
+            return index
+    return faiss.read_index(path)
+
+
+def owned_copy(index):
+    """
+    Deep copy of an index that is safe to add to. faiss.clone_index keeps
+    memory-mapped codes as a view, and adding to a view aborts the process.
+    """
+    return faiss.deserialize_index(faiss.serialize_index(index))
+
+
+def _logged_chunks(records: Sequence[WALRecord]) -> Dict[str, Tuple[str, Dict, np.ndarray]]:
+    logged = {}
+    for record in records:
+        for doc_id, text, metadata, vector in zip(record.ids, record.texts, record.metadatas, record.vectors):
+            logged[doc_id] = (text, metadata, vector)
+    return logged
+
+
+def replay_wal(db: FAISS, records: Sequence[WALRecord], embed_unlogged: bool = False) -> int:
+    """
+    Apply update log records on top of a loaded snapshot. Chunks already in the
+    docstore but missing from the index (a snapshot interrupted between its two
+    writes, or a flat index behind a compressed one) get their vectors back;
+    chunks not in the docstore are added. Missing chunks the log doesn't have
+    are re-embedded if `embed_unlogged`, and are an error otherwise.
+    Returns the number of chunks applied from the log.
+    """
+    logged = _logged_chunks(records)
+    known_ids = set(db.index_to_docstore_id.values())
+    missing = [db.index_to_docstore_id[position] for position in range(db.index.ntotal, len(db.index_to_docstore_id))]
+    unlogged = [doc_id for doc_id in missing if doc_id not in logged]
+    new_ids = [doc_id for doc_id in logged if doc_id not in known_ids]
+    if unlogged and not embed_unlogged:
+        raise ValueError(f"{len(unlogged)} chunks are missing from the index and from the update log")
+    if not missing and not new_ids:
+        return 0
+
+    db.index = owned_copy(db.index)
+    if missing:
+        if unlogged:
+            print(f"➕ Catching up {len(unlogged)} chunks added at runtime...")
+            embedded = db._embed_documents([db.docstore.search(doc_id).page_content for doc_id in unlogged])
+            logged.update((doc_id, (None, None, vector)) for doc_id, vector in zip(unlogged, embedded))
+        vectors = np.vstack([logged[doc_id][2] for doc_id in missing]).astype(np.float32)
+        if db._normalize_L2:
+            faiss.normalize_L2(vectors)
+        db.index.add(vectors)
+    if new_ids:
+        db.add_embeddings(
+            [(logged[doc_id][0], logged[doc_id][2].tolist()) for doc_id in new_ids],
+            metadatas=[logged[doc_id][1] for doc_id in new_ids],
+            ids=new_ids,
+        )
+    return len(missing) - len(unlogged) + len(new_ids)
+
+
+def _catch_up_flat_index(db: FAISS, folder: str, records: Sequence[WALRecord]):
+    """
+    Append logged vectors to the flat index.faiss for the positions it lacks,
+    so it keeps up when a compressed index is saved. Positions the log doesn't
+    have are left to load_existing_faiss to re-embed.
+    """
+    path = os.path.join(folder, FLAT_INDEX_NAME)
+    if not records or not os.path.exists(path):
+        return
+    logged = _logged_chunks(records)
+    flat = faiss.read_index(path)
+    vectors = []
+    for position in range(flat.ntotal, len(db.index_to_docstore_id)):
+        chunk = logged.get(db.index_to_docstore_id[position])
+        if chunk is None:
+            break
+        vectors.append(chunk[2])
+    if not vectors:
+        return
+    vectors = np.vstack(vectors).astype(np.float32)
+    if db._normalize_L2:
+        faiss.normalize_L2(vectors)
+    flat.add(vectors)
+    _atomic_write(path, lambda tmp_path: faiss.write_index(flat, tmp_path))
+
+
+def load_vector_store(folder: str, embeddings, prefer: str = "auto", mmap: bool = True,
+                      wal: Optional[IndexWAL] = None) -> Tuple[FAISS, str]:
+    """
+    Load the vector store for serving. Returns (db, name of the index file used).
+
+    `prefer` is "flat", "compressed" or "auto" (compressed when present); the
+    other file is the fallback. An index file is only used if it holds exactly
+    one vector per docstore entry (counting vectors recoverable from `wal`),
+    so a file left behind by a runtime update on the other one is skipped.
+    Records in `wal` are replayed on top of the snapshot.
+    """
+    docstore, index_to_docstore_id = load_docstore(folder)
+    records = wal.records() if wal is not None else []
+    logged_ids = {doc_id for record in records for doc_id in record.ids}
+
+    candidates = [COMPRESSED_INDEX_NAME, FLAT_INDEX_NAME]
+    if prefer == "flat":
+        candidates.reverse()
+
+    for index_name in candidates:
+        path = os.path.join(folder, index_name)
+        if not os.path.exists(path):
+            continue
+        index = read_index(path, mmap=mmap)
+        missing = range(index.ntotal, len(index_to_docstore_id))
+        if index.ntotal <= len(index_to_docstore_id) and all(index_to_docstore_id[p] in logged_ids for p in missing):
+            db = FAISS(embeddings, index, docstore, index_to_docstore_id)
+            replayed = replay_wal(db, records)
+            if replayed:
+                print(f"📜 Replayed {replayed} chunks from the update log")
+            return db, index_name
+        print(f"⚠️ Skipping {index_name}: {index.ntotal} vectors for {len(index_to_docstore_id)} documents")
+
+    raise FileNotFoundError(f"No FAISS index in '{folder}' matches its docstore")
+
+
+def flat_vectors(index) -> np.ndarray:
+    """All vectors of a flat index, in position order."""
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def build_compressed_index(vectors: np.ndarray, index_type: str, metric: int = faiss.METRIC_L2,
+                           nlist: Optional[int] = None, pq_m: int = 48, nprobe: int = 32):
+    """
+    Train and fill an SQ8 or IVF-PQ index with `vectors`, keeping their order
+    so positions still match the docstore map.
+    """
+    n, dim = vectors.shape
+    if index_type == "flat":
+        spec = "Flat"
+    elif index_type == "sq8":
+        spec = "SQ8"
+    elif index_type == "ivfpq":
+        if dim % pq_m:
+            raise ValueError(f"pq_m={pq_m} must divide the embedding dimension {dim}")
+        nlist = nlist or max(1, min(int(4 * np.sqrt(n)), n // 39))
+        spec = f"IVF{nlist},PQ{pq_m}"
+    else:
+        raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}")
+
+    index = faiss.index_factory(dim, spec, metric)
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(nprobe, ivf.nlist)
+    return index
+
+
+def index_size_bytes(index) -> int:
+    return len(faiss.serialize_index(index))
+
+
+def _recall_queries(vectors: np.ndarray, n_queries: int, seed: int) -> np.ndarray:
+    """Stored vectors with small Gaussian noise, so the nearest neighbour isn't trivially the query itself."""
+    rng = np.random.default_rng(seed)
+    sample = vectors[rng.choice(len(vectors), size=min(n_queries, len(vectors)), replace=False)]
+    return (sample + rng.normal(scale=0.01, size=sample.shape)).astype(np.float32)
+
+
+def _recall(found: np.ndarray, truth: np.ndarray, k: int) -> float:
+    return float(np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)]))
+
+
+def export_compressed_index(db: FAISS, folder: str, index_type: str, min_recall: float = MIN_RECALL,
+                            k: int = 10, n_queries: int = 200, **build_kwargs):
+    """
+    Write a compressed copy of a flat store's index next to it, if its
+    recall@k against exact search is at least `min_recall`. Serving picks the
+    compressed copy whenever it exists, so one that loses too many neighbours
+    is not written. Returns the index, or None if it was refused.
+    """
+    vectors = flat_vectors(db.index)
+    index = build_compressed_index(vectors, index_type, metric=db.index.metric_type, **build_kwargs)
+    queries = _recall_queries(vectors, n_queries, seed=0)
+    recall = _recall(index.search(queries, k)[1], db.index.search(queries, k)[1], k)
+    if recall < min_recall:
+        print(f"⚠️ Not exporting {index_type}: recall@{k} {recall:.3f} is below {min_recall} "
+              f"(try sq8, a higher --nprobe or more --pq-m)")
+        return None
+    print(f"✅ {index_type} recall@{k} against exact search: {recall:.3f}")
+    _atomic_write(os.path.join(folder, COMPRESSED_INDEX_NAME), lambda path: faiss.write_index(index, path))
+    return index
+
+
+def recall_latency_report(vectors: np.ndarray, index_types: List[str] = INDEX_TYPES, k: int = 10,
+                          n_queries: int = 200, seed: int = 0, **build_kwargs) -> List[Dict]:
+    """
+    Compare compressed indexes against exact flat search over `vectors`.
+
+    Queries are stored vectors with small Gaussian noise, so the nearest
+    neighbour isn't trivially the query itself. Reports recall@k against the
+    flat ground truth, mean single-query latency and serialized size.
+    """
+    queries = _recall_queries(vectors, n_queries, seed)
+
+    flat = build_compressed_index(vectors, "flat")
+    _, truth = flat.search(queries, k)
+
+    report = []
+    for index_type in index_types:
+        build_start = time.perf_counter()
+        index = flat if index_type == "flat" else build_compressed_index(vectors, index_type, **build_kwargs)
+        build_seconds = time.perf_counter() - build_start
+
+        search_start = time.perf_counter()
+        found = np.vstack([index.search(query[None, :], k)[1] for query in queries])
+        latency_ms = (time.perf_counter() - search_start) / len(queries) * 1000
+
+        report.append({
+            "index_type": index_type,
+            f"recall@{k}": _recall(found, truth, k),
+            "latency_ms": latency_ms,
+            "size_mb": index_size_bytes(index) / 1e6,
+            "build_seconds": build_seconds,
+        })
+    return report